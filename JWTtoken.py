@@ -1,12 +1,16 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 import database
 import models
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 
@@ -19,6 +23,10 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 1440
 REFRESH_TOKEN_EXPIRE_DAYS = 30
 REFRESH_SECRET_KEY = os.getenv("REFRESH_KEY")
 
+# Verified token -> user cache, kept per process
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+
 # OAuth2 password bearer scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
@@ -41,19 +49,106 @@ def create_refresh_token(data: dict):
     return encoded_jwt
 
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)
+def decode_access_token(token: str):
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+
+# LRU cache of verified access tokens to detached user snapshots
+class UserCache:
+    def __init__(self, ttl_seconds: int, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at <= time.monotonic():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return user
+
+    def set(self, token: str, user: models.User, token_exp=None):
+        ttl = self.ttl_seconds
+        # Never keep a token cached past its own expiry
+        if token_exp is not None:
+            ttl = min(ttl, token_exp - time.time())
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[token] = (time.monotonic() + ttl, user)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            stale = [
+                token
+                for token, (_, user) in self._entries.items()
+                if user.id == user_id
+            ]
+            for token in stale:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache(USER_CACHE_TTL_SECONDS, USER_CACHE_MAX_SIZE)
+
+
+# Drop cached sessions of a user after their row changes
+def invalidate_user(user_id: int):
+    user_cache.invalidate_user(user_id)
+
+
+# Copy the loaded columns into a session-independent User object
+def snapshot_user(user: models.User):
+    return models.User(
+        **{
+            column.key: getattr(user, column.key)
+            for column in models.User.__table__.columns
+        }
+    )
+
+
+async def get_current_user(
+    request: Request,
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(database.get_db),
 ):
+    # Reuse the payload HospitalAccessMiddleware already decoded
+    payload = getattr(request.state, "token_payload", None)
+    return await get_user_for_token(token, db, payload)
+
+
+# The user an access token belongs to, for routes that cannot use the
+# Authorization header (WebSockets take the token as a query parameter)
+async def get_user_for_token(token: str, db: AsyncSession, payload: dict = None):
+    user = user_cache.get(token)
+    if user is not None:
+        return user
+
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        if payload is None:
+            payload = decode_access_token(token)
         username: str = payload.get("sub")
         id: int = payload.get("id")
         if username is None or id is None:
             raise get_user_exception()
-        user = db.query(models.User).filter(models.User.id == id).first()
+        user = await db.scalar(select(models.User).where(models.User.id == id))
         if user is None:
             raise get_user_exception()
 
+        user = snapshot_user(user)
+        user_cache.set(token, user, payload.get("exp"))
         return user
     except JWTError:
         raise get_user_exception()
@@ -0,0 +1,36 @@
+"""Add detection cache table
+
+Revision ID: 1f6a9d3c5b27
+Revises: e3b8f90a41c6
+Create Date: 2026-10-18 14:05:38.114902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "1f6a9d3c5b27"
+down_revision: Union[str, None] = "e3b8f90a41c6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "lab_detectioncache",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("sha256", sa.String(length=64), nullable=False),
+        sa.Column("model_version", sa.String(length=100), nullable=False),
+        sa.Column("detected", sa.JSON(), nullable=False),
+        sa.Column("processed_image_urls", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("sha256", "model_version"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("lab_detectioncache")
@@ -0,0 +1,57 @@
+"""Add detection job table
+
+Revision ID: 3c9e41f0a7d2
+Revises: 27bd239ecd6e
+Create Date: 2026-10-18 09:12:40.118237
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3c9e41f0a7d2"
+down_revision: Union[str, None] = "27bd239ecd6e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "lab_detectionjob",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("progress", sa.Integer(), nullable=False),
+        sa.Column("message", sa.Text(), nullable=True),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("worker_id", sa.String(length=255), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.Column("cell_test_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("result_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.ForeignKeyConstraint(["cell_test_id"], ["lab_celltest.id"]),
+        sa.ForeignKeyConstraint(["result_id"], ["lab_result.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_lab_detectionjob_status", "lab_detectionjob", ["status"], unique=False
+    )
+    op.create_index(
+        "ix_lab_detectionjob_status_created_at",
+        "lab_detectionjob",
+        ["status", "created_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_lab_detectionjob_status_created_at", table_name="lab_detectionjob"
+    )
+    op.drop_index("ix_lab_detectionjob_status", table_name="lab_detectionjob")
+    op.drop_table("lab_detectionjob")
@@ -0,0 +1,41 @@
+"""Add password reset token cleanup indexes
+
+Revision ID: 5e1c7b2d9a40
+Revises: 8d2f6a1b9e04
+Create Date: 2026-10-18 12:20:41.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5e1c7b2d9a40"
+down_revision: Union[str, None] = "8d2f6a1b9e04"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        op.f("ix_password_reset_tokens_created_at"),
+        "password_reset_tokens",
+        ["created_at"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_password_reset_tokens_used",
+        "password_reset_tokens",
+        ["used"],
+        unique=False,
+        postgresql_where=sa.text("used"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_password_reset_tokens_used", table_name="password_reset_tokens")
+    op.drop_index(
+        op.f("ix_password_reset_tokens_created_at"), table_name="password_reset_tokens"
+    )
@@ -0,0 +1,43 @@
+"""Add detection job image progress
+
+Revision ID: 6b0e2d7f8c13
+Revises: 1f6a9d3c5b27
+Create Date: 2026-10-18 14:52:17.402385
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "6b0e2d7f8c13"
+down_revision: Union[str, None] = "1f6a9d3c5b27"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "lab_detectionjob",
+        sa.Column("images_total", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.add_column(
+        "lab_detectionjob",
+        sa.Column("images_done", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.create_index(
+        "ix_lab_detectionjob_cell_test_updated_at",
+        "lab_detectionjob",
+        ["cell_test_id", "updated_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_lab_detectionjob_cell_test_updated_at", table_name="lab_detectionjob"
+    )
+    op.drop_column("lab_detectionjob", "images_done")
+    op.drop_column("lab_detectionjob", "images_total")
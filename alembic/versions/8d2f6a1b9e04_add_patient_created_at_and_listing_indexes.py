@@ -0,0 +1,55 @@
+"""Add patient created_at and listing indexes
+
+Revision ID: 8d2f6a1b9e04
+Revises: 3c9e41f0a7d2
+Create Date: 2026-10-18 10:03:27.540913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8d2f6a1b9e04"
+down_revision: Union[str, None] = "3c9e41f0a7d2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "lab_patient",
+        sa.Column(
+            "created_at",
+            sa.DateTime(),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+    )
+    op.create_index(
+        "ix_lab_patient_hospital_name",
+        "lab_patient",
+        ["hospital_id", "last_name", "first_name", "id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_lab_patient_hospital_birth_date",
+        "lab_patient",
+        ["hospital_id", "birth_date"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_lab_patient_hospital_created_at",
+        "lab_patient",
+        ["hospital_id", "created_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_lab_patient_hospital_created_at", table_name="lab_patient")
+    op.drop_index("ix_lab_patient_hospital_birth_date", table_name="lab_patient")
+    op.drop_index("ix_lab_patient_hospital_name", table_name="lab_patient")
+    op.drop_column("lab_patient", "created_at")
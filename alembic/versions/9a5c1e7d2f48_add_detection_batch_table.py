@@ -0,0 +1,57 @@
+"""Add detection batch table
+
+Revision ID: 9a5c1e7d2f48
+Revises: 6b0e2d7f8c13
+Create Date: 2026-10-18 15:31:44.670219
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9a5c1e7d2f48"
+down_revision: Union[str, None] = "6b0e2d7f8c13"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "lab_detectionbatch",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("requested_by", sa.Integer(), nullable=True),
+        sa.Column("total_jobs", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["requested_by"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.add_column(
+        "lab_detectionjob",
+        sa.Column("batch_id", postgresql.UUID(as_uuid=True), nullable=True),
+    )
+    op.create_index(
+        op.f("ix_lab_detectionjob_batch_id"),
+        "lab_detectionjob",
+        ["batch_id"],
+        unique=False,
+    )
+    op.create_foreign_key(
+        "lab_detectionjob_batch_id_fkey",
+        "lab_detectionjob",
+        "lab_detectionbatch",
+        ["batch_id"],
+        ["id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint(
+        "lab_detectionjob_batch_id_fkey", "lab_detectionjob", type_="foreignkey"
+    )
+    op.drop_index(op.f("ix_lab_detectionjob_batch_id"), table_name="lab_detectionjob")
+    op.drop_column("lab_detectionjob", "batch_id")
+    op.drop_table("lab_detectionbatch")
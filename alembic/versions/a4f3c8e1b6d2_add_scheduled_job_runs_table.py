@@ -0,0 +1,46 @@
+"""Add scheduled job runs table
+
+Revision ID: a4f3c8e1b6d2
+Revises: 5e1c7b2d9a40
+Create Date: 2026-10-18 12:48:09.604127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a4f3c8e1b6d2"
+down_revision: Union[str, None] = "5e1c7b2d9a40"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "scheduled_job_runs",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("job_name", sa.String(length=100), nullable=False),
+        sa.Column("host", sa.String(length=255), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=False),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.Column("duration", sa.Float(), nullable=True),
+        sa.Column("message", sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_scheduled_job_runs_job_name_started_at",
+        "scheduled_job_runs",
+        ["job_name", "started_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_scheduled_job_runs_job_name_started_at", table_name="scheduled_job_runs"
+    )
+    op.drop_table("scheduled_job_runs")
@@ -0,0 +1,123 @@
+"""Add result detection metrics
+
+Revision ID: b2e47c9f0d15
+Revises: 9a5c1e7d2f48
+Create Date: 2026-10-18 16:08:21.935410
+
+"""
+
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "b2e47c9f0d15"
+down_revision: Union[str, None] = "9a5c1e7d2f48"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Descriptions written by the detection worker, e.g.
+# "Background: 10 pixels detected as background, Inflammatory: 2 pixels ..."
+DESCRIPTION = re.compile(
+    r"Background: (\d+) pixels.*Inflammatory: (\d+) pixels.*Cells: (\d+) pixels",
+    re.DOTALL,
+)
+BACKFILL_BATCH_SIZE = 1000
+
+result = sa.table(
+    "lab_result",
+    sa.column("id", sa.Uuid()),
+    sa.column("description", sa.Text()),
+    sa.column("background_pixels", sa.BigInteger()),
+    sa.column("inflammatory_pixels", sa.BigInteger()),
+    sa.column("cell_pixels", sa.BigInteger()),
+    sa.column("inflammatory_ratio", sa.Float()),
+    sa.column("cell_ratio", sa.Float()),
+)
+
+
+def parse_metrics(row):
+    match = DESCRIPTION.search(row.description)
+    if not match:
+        return None
+    background, inflammatory, cells = map(int, match.groups())
+    total = background + inflammatory + cells
+    return {
+        "result_id": row.id,
+        "background_pixels": background,
+        "inflammatory_pixels": inflammatory,
+        "cell_pixels": cells,
+        "inflammatory_ratio": inflammatory / total if total else None,
+        "cell_ratio": cells / total if total else None,
+    }
+
+
+# Walks the results in id order one batch at a time, so neither the rows nor
+# the updates for the whole table are held in memory
+def backfill():
+    connection = op.get_bind()
+    statement = (
+        result.update()
+        .where(result.c.id == sa.bindparam("result_id"))
+        .values(
+            background_pixels=sa.bindparam("background_pixels"),
+            inflammatory_pixels=sa.bindparam("inflammatory_pixels"),
+            cell_pixels=sa.bindparam("cell_pixels"),
+            inflammatory_ratio=sa.bindparam("inflammatory_ratio"),
+            cell_ratio=sa.bindparam("cell_ratio"),
+        )
+    )
+
+    last_id = None
+    while True:
+        query = sa.select(result.c.id, result.c.description).where(
+            result.c.description.like("Background: %")
+        )
+        if last_id is not None:
+            query = query.where(result.c.id > last_id)
+        rows = connection.execute(
+            query.order_by(result.c.id).limit(BACKFILL_BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            return
+        last_id = rows[-1].id
+
+        updates = [update for update in map(parse_metrics, rows) if update]
+        if updates:
+            connection.execute(statement, updates)
+
+
+def upgrade() -> None:
+    op.add_column("lab_result", sa.Column("background_pixels", sa.BigInteger()))
+    op.add_column("lab_result", sa.Column("inflammatory_pixels", sa.BigInteger()))
+    op.add_column("lab_result", sa.Column("cell_pixels", sa.BigInteger()))
+    op.add_column("lab_result", sa.Column("inflammatory_ratio", sa.Float()))
+    op.add_column("lab_result", sa.Column("cell_ratio", sa.Float()))
+
+    backfill()
+
+    op.create_index(
+        op.f("ix_lab_result_inflammatory_ratio"),
+        "lab_result",
+        ["inflammatory_ratio"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_lab_result_cell_ratio"), "lab_result", ["cell_ratio"], unique=False
+    )
+    op.create_index(
+        "ix_lab_result_created_at", "lab_result", ["created_at"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_lab_result_created_at", table_name="lab_result")
+    op.drop_index(op.f("ix_lab_result_cell_ratio"), table_name="lab_result")
+    op.drop_index(op.f("ix_lab_result_inflammatory_ratio"), table_name="lab_result")
+    op.drop_column("lab_result", "cell_ratio")
+    op.drop_column("lab_result", "inflammatory_ratio")
+    op.drop_column("lab_result", "cell_pixels")
+    op.drop_column("lab_result", "inflammatory_pixels")
+    op.drop_column("lab_result", "background_pixels")
@@ -0,0 +1,31 @@
+"""Add cell test listing index
+
+Revision ID: c7d21e5f3a98
+Revises: a4f3c8e1b6d2
+Create Date: 2026-10-18 13:12:55.281640
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c7d21e5f3a98"
+down_revision: Union[str, None] = "a4f3c8e1b6d2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_lab_celltest_patient_created_at",
+        "lab_celltest",
+        ["patient_id", "created_at", "id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_lab_celltest_patient_created_at", table_name="lab_celltest")
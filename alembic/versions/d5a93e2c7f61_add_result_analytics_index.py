@@ -0,0 +1,32 @@
+"""Add result analytics index
+
+Revision ID: d5a93e2c7f61
+Revises: b2e47c9f0d15
+Create Date: 2026-10-18 17:42:05.118264
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d5a93e2c7f61"
+down_revision: Union[str, None] = "b2e47c9f0d15"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_lab_result_celltest_created_at",
+        "lab_result",
+        ["celltest_id", "created_at"],
+        unique=False,
+        postgresql_include=["inflammatory_ratio", "cell_ratio"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_lab_result_celltest_created_at", table_name="lab_result")
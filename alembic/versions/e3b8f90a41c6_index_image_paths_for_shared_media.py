@@ -0,0 +1,43 @@
+"""Index image paths for shared media
+
+Revision ID: e3b8f90a41c6
+Revises: c7d21e5f3a98
+Create Date: 2026-10-18 13:40:12.907215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e3b8f90a41c6"
+down_revision: Union[str, None] = "c7d21e5f3a98"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Content-addressed paths are longer than the old uuid names
+    for table in ("lab_celltestimagedata", "lab_resultimagedata"):
+        op.alter_column(
+            table,
+            "image",
+            existing_type=sa.String(length=100),
+            type_=sa.String(length=255),
+            existing_nullable=False,
+        )
+        op.create_index(op.f(f"ix_{table}_image"), table, ["image"], unique=False)
+
+
+def downgrade() -> None:
+    for table in ("lab_celltestimagedata", "lab_resultimagedata"):
+        op.drop_index(op.f(f"ix_{table}_image"), table_name=table)
+        op.alter_column(
+            table,
+            "image",
+            existing_type=sa.String(length=255),
+            type_=sa.String(length=100),
+            existing_nullable=False,
+        )
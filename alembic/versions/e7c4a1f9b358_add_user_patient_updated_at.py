@@ -0,0 +1,52 @@
+"""Add user and patient updated_at
+
+Revision ID: e7c4a1f9b358
+Revises: d5a93e2c7f61
+Create Date: 2026-10-18 19:15:47.602118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e7c4a1f9b358"
+down_revision: Union[str, None] = "d5a93e2c7f61"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "users",
+        sa.Column(
+            "updated_at", sa.DateTime(), server_default=sa.func.now(), nullable=False
+        ),
+    )
+    op.add_column(
+        "lab_patient",
+        sa.Column(
+            "updated_at", sa.DateTime(), server_default=sa.func.now(), nullable=False
+        ),
+    )
+    op.create_index(
+        "ix_users_hospital_updated_at",
+        "users",
+        ["hospital_id", "updated_at"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_lab_patient_hospital_updated_at",
+        "lab_patient",
+        ["hospital_id", "updated_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_lab_patient_hospital_updated_at", table_name="lab_patient")
+    op.drop_index("ix_users_hospital_updated_at", table_name="users")
+    op.drop_column("lab_patient", "updated_at")
+    op.drop_column("users", "updated_at")
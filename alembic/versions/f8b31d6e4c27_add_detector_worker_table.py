@@ -0,0 +1,44 @@
+"""Add detector worker table
+
+Revision ID: f8b31d6e4c27
+Revises: e7c4a1f9b358
+Create Date: 2026-10-18 19:42:10.518337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f8b31d6e4c27"
+down_revision: Union[str, None] = "e7c4a1f9b358"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "lab_detectorworker",
+        sa.Column("id", sa.String(length=255), nullable=False),
+        sa.Column("circuit_state", sa.String(length=20), nullable=False),
+        sa.Column("failures", sa.Integer(), nullable=False),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("opened_at", sa.DateTime(), nullable=True),
+        sa.Column("heartbeat_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_lab_detectorworker_heartbeat_at"),
+        "lab_detectorworker",
+        ["heartbeat_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        op.f("ix_lab_detectorworker_heartbeat_at"), table_name="lab_detectorworker"
+    )
+    op.drop_table("lab_detectorworker")
@@ -0,0 +1,111 @@
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+import datetime
+import numpy as np
+import models
+
+PERCENTILES = (10, 25, 50, 75, 90, 95, 99)
+RATIO_METRICS = ("inflammatory_ratio", "cell_ratio")
+PIXEL_METRICS = ("background_pixels", "inflammatory_pixels", "cell_pixels")
+
+
+# Count, mean, percentiles and a histogram for each ratio column. rows are
+# the (inflammatory_ratio, cell_ratio) tuples of one columnar fetch.
+def summarize_ratios(rows: list, bins: int):
+    values = np.array(rows, dtype=float).reshape(-1, len(RATIO_METRICS))
+    summary = {}
+    for index, name in enumerate(RATIO_METRICS):
+        column = values[:, index]
+        column = column[~np.isnan(column)]
+        counts, edges = np.histogram(column, bins=bins, range=(0.0, 1.0))
+        summary[name] = {
+            "count": int(column.size),
+            "histogram": {
+                "edges": np.round(edges, 6).tolist(),
+                "counts": counts.tolist(),
+            },
+        }
+        if column.size:
+            summary[name].update(
+                mean=float(column.mean()),
+                min=float(column.min()),
+                max=float(column.max()),
+                percentiles=dict(
+                    zip(
+                        (f"p{p}" for p in PERCENTILES),
+                        np.percentile(column, PERCENTILES).tolist(),
+                    )
+                ),
+            )
+    return summary
+
+
+# Cell tests are counted by their creation date, detection metrics by the
+# creation date of their result. end is inclusive.
+async def hospital_analytics(
+    db: AsyncSession,
+    hospital_id: int,
+    start: datetime.date,
+    end: datetime.date,
+    bins: int,
+):
+    since = datetime.datetime.combine(start, datetime.time.min)
+    until = datetime.datetime.combine(
+        end + datetime.timedelta(days=1), datetime.time.min
+    )
+
+    status_counts = dict(
+        (
+            await db.execute(
+                select(models.CellTest.detection_status, func.count())
+                .join(models.Patient, models.CellTest.patient_id == models.Patient.id)
+                .where(
+                    models.Patient.hospital_id == hospital_id,
+                    models.CellTest.created_at >= since,
+                    models.CellTest.created_at < until,
+                )
+                .group_by(models.CellTest.detection_status)
+            )
+        ).all()
+    )
+
+    results = (
+        select(models.Result)
+        .join(models.CellTest, models.Result.celltest_id == models.CellTest.id)
+        .join(models.Patient, models.CellTest.patient_id == models.Patient.id)
+        .where(
+            models.Patient.hospital_id == hospital_id,
+            models.Result.created_at >= since,
+            models.Result.created_at < until,
+        )
+    )
+    totals = (
+        await db.execute(
+            results.with_only_columns(
+                func.count(),
+                *(
+                    func.coalesce(func.sum(getattr(models.Result, name)), 0)
+                    for name in PIXEL_METRICS
+                ),
+            )
+        )
+    ).one()
+    ratios = (
+        await db.execute(
+            results.with_only_columns(
+                *(getattr(models.Result, name) for name in RATIO_METRICS)
+            )
+        )
+    ).all()
+
+    return {
+        "hospital_id": hospital_id,
+        "start": start,
+        "end": end,
+        "cell_tests": sum(status_counts.values()),
+        "detection_status": status_counts,
+        "results": totals[0],
+        "pixels": {name: int(total) for name, total in zip(PIXEL_METRICS, totals[1:])},
+        "metrics": await run_in_threadpool(summarize_ratios, ratios, bins),
+    }
@@ -0,0 +1,143 @@
+import argparse
+import statistics
+import time
+import uuid
+from datetime import datetime
+from typing import List
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.testclient import TestClient
+
+import models
+import schemas
+from fieldsets import Fieldset
+from responses import ModelResponse
+
+# Compares the old response path (response_model validation, jsonable_encoder
+# and stdlib json) with the current one on in-memory rows shaped like the
+# large list endpoints, e.g.
+#   python benchmark_responses.py --rows 2000 --repeat 20
+# Needs the same .env as the app, nothing is read from the database.
+
+
+def make_users(count: int):
+    return [
+        models.User(
+            id=index,
+            username=f"user{index}",
+            email=f"user{index}@example.com",
+            full_name=f"User {index}",
+            address="Kathmandu",
+            blood_group="O+",
+            gender="female",
+            contact_no="9800000000",
+            is_verified=True,
+            is_admin=False,
+            is_hospital_admin=False,
+            hospital_id=1,
+        )
+        for index in range(count)
+    ]
+
+
+# Cell tests with two results of three images each
+def make_cell_tests(count: int):
+    cell_tests = []
+    for index in range(count):
+        cell_test = models.CellTest(
+            id=uuid.uuid4(),
+            title=f"Cell test {index}",
+            description="Biopsy sample",
+            created_at=datetime(2024, 1, 1),
+            updated_at=datetime(2024, 1, 2),
+            detection_status="completed",
+        )
+        for _ in range(2):
+            result = models.Result(
+                id=uuid.uuid4(),
+                celltest_id=cell_test.id,
+                description="Background: 1 pixels, Inflammatory: 2, Cells: 3",
+                created_at=datetime(2024, 1, 2),
+                inflammatory_ratio=0.3,
+                cell_ratio=0.5,
+            )
+            result.result_images = [
+                models.ResultImageData(id=image, result_id=result.id, image="a.png")
+                for image in range(3)
+            ]
+            cell_test.results.append(result)
+        cell_tests.append(cell_test)
+    return cell_tests
+
+
+def make_app(users, cell_tests):
+    app = FastAPI()
+    cell_test_fields = Fieldset(
+        models.CellTest,
+        schemas.CellTestFetch,
+        default_expand=("results.result_images",),
+    )
+
+    @app.get(
+        "/before/users",
+        response_model=List[schemas.User],
+        response_class=JSONResponse,
+    )
+    async def users_before():
+        return users
+
+    @app.get("/after/users", response_model=List[schemas.User])
+    async def users_after():
+        return ModelResponse(users, List[schemas.User])
+
+    @app.get(
+        "/before/cell_tests",
+        response_model=schemas.CellTestPage,
+        response_class=JSONResponse,
+    )
+    async def cell_tests_before():
+        return {"items": cell_tests, "next_cursor": None}
+
+    @app.get("/after/cell_tests")
+    async def cell_tests_after():
+        selection = cell_test_fields.parse(None, None)
+        return ORJSONResponse(
+            {
+                "items": [
+                    cell_test_fields.render(cell_test, selection)
+                    for cell_test in cell_tests
+                ],
+                "next_cursor": None,
+            }
+        )
+
+    return app
+
+
+def timed(client: TestClient, path: str, repeat: int):
+    client.get(path).raise_for_status()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(path)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), len(response.content)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark JSON list responses")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    client = TestClient(make_app(make_users(args.rows), make_cell_tests(args.rows)))
+    print(f"{args.rows} rows, median of {args.repeat} requests")
+    for endpoint in ("users", "cell_tests"):
+        before, size = timed(client, f"/before/{endpoint}", args.repeat)
+        after, _ = timed(client, f"/after/{endpoint}", args.repeat)
+        print(
+            f"{endpoint:<12} before {before * 1000:8.1f} ms"
+            f"  after {after * 1000:8.1f} ms"
+            f"  {before / after:4.1f}x  ({size // 1024} KiB)"
+        )
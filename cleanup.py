@@ -1,25 +1,49 @@
-from apscheduler.schedulers.background import BackgroundScheduler
+from sqlalchemy import delete, select
+from scheduler import scheduler
 import database
 import models
 import datetime
+import os
 
 
 TOKEN_EXPIRATION_DURATION = datetime.timedelta(minutes=30)
 
+# Rows removed per DELETE; each chunk commits on its own to keep locks short
+CLEANUP_BATCH_SIZE = int(os.getenv("TOKEN_CLEANUP_BATCH_SIZE", "5000"))
+# Run every N minutes when set, otherwise once a day at midnight
+CLEANUP_INTERVAL_MINUTES = os.getenv("TOKEN_CLEANUP_INTERVAL_MINUTES")
+
+
+# Delete matching tokens in chunks, returns the number of rows removed
+def _delete_tokens(db, condition):
+    deleted = 0
+    while True:
+        chunk = (
+            select(models.PasswordResetToken.id)
+            .where(condition)
+            .limit(CLEANUP_BATCH_SIZE)
+        )
+        result = db.execute(
+            delete(models.PasswordResetToken)
+            .where(models.PasswordResetToken.id.in_(chunk))
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        deleted += result.rowcount
+        if result.rowcount < CLEANUP_BATCH_SIZE:
+            return deleted
+
 
 def delete_expired_tokens():
     db = database.SessionLocal()
     try:
-        expired_tokens = db.query(models.PasswordResetToken).all()
-        if expired_tokens:
-            current_time = datetime.datetime.utcnow()
-            for token in expired_tokens:
-                if token.used or (
-                    token.created_at + TOKEN_EXPIRATION_DURATION <= current_time
-                ):
-                    db.delete(token)
-            db.commit()
-            print("Cleaning process successful")
+        cutoff = datetime.datetime.utcnow() - TOKEN_EXPIRATION_DURATION
+        # Two passes so each one can use its own index
+        deleted = _delete_tokens(db, models.PasswordResetToken.used.is_(True))
+        deleted += _delete_tokens(db, models.PasswordResetToken.created_at <= cutoff)
+
+        if deleted:
+            print(f"Cleaning process successful, {deleted} tokens deleted")
         else:
             print("Nothing to clean")
 
@@ -27,15 +51,20 @@ def delete_expired_tokens():
         if now.hour == 0 and now.minute == 00:
             print("Message cleaner is running at 12 AM")
 
+        return deleted
     finally:
         db.close()
 
 
-# Create an instance of BackgroundScheduler
-scheduler = BackgroundScheduler()
-
-# Add the job to the scheduler
-scheduler.add_job(delete_expired_tokens, "cron", hour=0, minute=00)
-
-# Start the scheduler
-scheduler.start()
+# Register the job with the leader scheduler
+if CLEANUP_INTERVAL_MINUTES:
+    scheduler.add_job(
+        "delete_expired_tokens",
+        delete_expired_tokens,
+        "interval",
+        minutes=int(CLEANUP_INTERVAL_MINUTES),
+    )
+else:
+    scheduler.add_job(
+        "delete_expired_tokens", delete_expired_tokens, "cron", hour=0, minute=00
+    )
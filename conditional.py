@@ -0,0 +1,49 @@
+from fastapi import Request, Response, status
+from email.utils import format_datetime
+import datetime
+import hashlib
+
+
+# Strong ETag for a response built from rows in the given state. The path and
+# query string are part of it since cursor, limit, fields and expand all
+# change the body.
+def make_etag(request: Request, state: tuple):
+    key = repr((request.url.path, str(request.query_params), state))
+    return f'"{hashlib.sha256(key.encode()).hexdigest()[:32]}"'
+
+
+def etag_matches(request: Request, etag: str):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    # If-None-Match uses the weak comparison, W/ prefixes are ignored
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+# state_query selects aggregates of the rows behind a list, such as their
+# count and latest updated_at; any change to them changes the ETag, as does
+# anything in key. Returns a 304 response when the client's copy is current,
+# otherwise None, plus the headers to send with the full response.
+#
+# If-Modified-Since alone is not honoured: deleting a row does not move the
+# latest timestamp, only the count.
+async def conditional_get(request: Request, db, state_query, *key):
+    state = (*key, *(await db.execute(state_query)).one())
+    headers = {
+        "ETag": make_etag(request, state),
+        # Per user data: browsers may keep it but must revalidate every time
+        "Cache-Control": "private, no-cache",
+    }
+
+    timestamps = [value for value in state if isinstance(value, datetime.datetime)]
+    if timestamps:
+        last_modified = max(timestamps).replace(tzinfo=datetime.timezone.utc)
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+
+    if etag_matches(request, headers["ETag"]):
+        return (
+            Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers),
+            headers,
+        )
+    return None, headers
@@ -1,4 +1,6 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -10,15 +12,55 @@ load_dotenv()
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# Async drivers used by the API for each sync URL scheme
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def make_async_url(url: str):
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or make_async_url(
+    SQLALCHEMY_DATABASE_URL
+)
+
+# Connection pool settings, shared by the sync and async engines
+POOL_OPTIONS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+}
+
+
+# SQLite (used for local runs) manages its own connections
+def pool_options(url):
+    return {} if make_url(url).get_backend_name() == "sqlite" else POOL_OPTIONS
+
+
+# Sync engine for background workers, scheduled jobs and table creation
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL, **pool_options(SQLALCHEMY_DATABASE_URL)
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Async engine for the API
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL, **pool_options(ASYNC_DATABASE_URL)
+)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
 
 # Dependency to get database session
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
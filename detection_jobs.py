@@ -0,0 +1,575 @@
+import argparse
+import datetime
+import hashlib
+import logging
+import os
+import re
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import httpx
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+import database
+import models
+from detector_client import CircuitOpenError, detector_client
+
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Base URL the detector uses to fetch our media
+MEDIA_BASE_URL = os.getenv("MEDIA_BASE_URL", "http://127.0.0.1:8000/")
+# How images reach the detector:
+#   url       - detector downloads them from our /media mount (MEDIA_BASE_URL)
+#   path      - co-located detector reads them from disk, absolute paths are sent
+#   multipart - file bytes are uploaded with the request, for remote detectors
+DETECTOR_TRANSPORT = os.getenv("DETECTOR_TRANSPORT", "url")
+if DETECTOR_TRANSPORT not in ("url", "path", "multipart"):
+    raise ValueError(f"Unknown DETECTOR_TRANSPORT: {DETECTOR_TRANSPORT}")
+# Cached detections are only reused for the same model version. It is read
+# from the detector's health URL for every job; set DETECTOR_MODEL_VERSION
+# only to override that. With neither, the cache is not used.
+DETECTOR_MODEL_VERSION = os.getenv("DETECTOR_MODEL_VERSION")
+
+# Worker tuning
+POLL_INTERVAL_SECONDS = float(os.getenv("DETECTION_POLL_INTERVAL", "2"))
+MAX_ATTEMPTS = int(os.getenv("DETECTION_MAX_ATTEMPTS", "3"))
+# Running jobs that have not reported progress for this long belong to a dead worker
+STALE_JOB_TIMEOUT = datetime.timedelta(
+    minutes=int(os.getenv("DETECTION_STALE_MINUTES", "30"))
+)
+# Detector calls in flight per worker process, shared by all its jobs
+IMAGE_CONCURRENCY = int(os.getenv("DETECTION_IMAGE_CONCURRENCY", "4"))
+# Most cell tests accepted in one batch
+MAX_BATCH_SIZE = int(os.getenv("DETECTION_MAX_BATCH_SIZE", "10000"))
+# Each worker process publishes its circuit breaker state this often; a
+# process silent for three intervals is no longer reported
+HEARTBEAT_INTERVAL_SECONDS = float(os.getenv("DETECTION_HEARTBEAT_INTERVAL", "10"))
+WORKER_HEARTBEAT_TIMEOUT = datetime.timedelta(seconds=3 * HEARTBEAT_INTERVAL_SECONDS)
+
+# Job statuses
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+ACTIVE_STATUSES = (JOB_QUEUED, JOB_RUNNING)
+
+
+class DetectionError(Exception):
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+# Queue a detection job from the API, reusing one already waiting or running
+async def enqueue_job(db, cell_test_id):
+    job = await db.scalar(
+        select(models.DetectionJob).where(
+            models.DetectionJob.cell_test_id == cell_test_id,
+            models.DetectionJob.status.in_(ACTIVE_STATUSES),
+        )
+    )
+    if job:
+        return job
+
+    job = models.DetectionJob(cell_test_id=cell_test_id, status=JOB_QUEUED)
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    return job
+
+
+# Queue one job per cell test under a new batch. Returns the batch and the
+# jobs skipped because their cell test is already active in another batch.
+async def enqueue_batch(db, cell_test_ids: list, requested_by: int = None):
+    batch = models.DetectionBatch(requested_by=requested_by)
+    db.add(batch)
+    await db.flush()
+
+    # Cell tests with a job waiting or running get no second one, which would
+    # run detection twice and store two results. Single jobs are adopted by
+    # the batch, jobs of another batch stay there and are reported back.
+    active_jobs = (
+        await db.scalars(
+            select(models.DetectionJob).where(
+                models.DetectionJob.cell_test_id.in_(cell_test_ids),
+                models.DetectionJob.status.in_(ACTIVE_STATUSES),
+            )
+        )
+    ).all()
+    adopted = [job.id for job in active_jobs if job.batch_id is None]
+    skipped = [job for job in active_jobs if job.batch_id is not None]
+    if adopted:
+        await db.execute(
+            update(models.DetectionJob)
+            .where(models.DetectionJob.id.in_(adopted))
+            .values(batch_id=batch.id)
+        )
+
+    active = {job.cell_test_id for job in active_jobs}
+    new_jobs = [
+        {
+            "id": uuid.uuid4(),
+            "cell_test_id": cell_test_id,
+            "status": JOB_QUEUED,
+            "batch_id": batch.id,
+        }
+        for cell_test_id in cell_test_ids
+        if cell_test_id not in active
+    ]
+    if new_jobs:
+        await db.execute(insert(models.DetectionJob), new_jobs)
+    batch.total_jobs = len(adopted) + len(new_jobs)
+    await db.commit()
+    return batch, skipped
+
+
+# Claim the oldest queued job; SKIP LOCKED lets several workers poll concurrently
+def claim_next_job(db, worker_id: str):
+    job = (
+        db.query(models.DetectionJob)
+        .filter(models.DetectionJob.status == JOB_QUEUED)
+        .order_by(models.DetectionJob.created_at)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if job is None:
+        db.commit()
+        return None
+
+    now = datetime.datetime.utcnow()
+    job.status = JOB_RUNNING
+    job.worker_id = worker_id
+    job.attempts += 1
+    job.progress = 0
+    job.images_done = 0
+    job.message = "Job picked up by worker"
+    job.started_at = now
+    job.updated_at = now
+    db.commit()
+    return job
+
+
+# Put jobs abandoned by crashed or restarted workers back on the queue
+def requeue_stale_jobs(db):
+    cutoff = datetime.datetime.utcnow() - STALE_JOB_TIMEOUT
+    stale = (
+        db.query(models.DetectionJob)
+        .filter(
+            models.DetectionJob.status == JOB_RUNNING,
+            models.DetectionJob.updated_at < cutoff,
+        )
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    for job in stale:
+        job.status = JOB_QUEUED if job.attempts < MAX_ATTEMPTS else JOB_FAILED
+        job.message = "Worker stopped responding"
+        job.worker_id = None
+        job.updated_at = datetime.datetime.utcnow()
+    db.commit()
+    return len(stale)
+
+
+def send_progress(db, job, progress: int, message: str):
+    job.progress = progress
+    job.message = message
+    job.updated_at = datetime.datetime.utcnow()
+    db.commit()
+    logger.info(f"Detection job {job.id}: {progress}% {message}")
+
+
+SHA256_NAME = re.compile(r"[0-9a-f]{64}")
+
+
+# Uploads are named by content hash; older uuid-named files are hashed here
+def image_sha256(path: str):
+    name = Path(path).stem
+    if SHA256_NAME.fullmatch(name):
+        return name
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as image_file:
+            while chunk := image_file.read(1024 * 1024):
+                digest.update(chunk)
+    except OSError as e:
+        raise DetectionError(f"Cannot read image {path}: {e}")
+    return digest.hexdigest()
+
+
+def post_image(image_path: str):
+    if DETECTOR_TRANSPORT == "path":
+        return detector_client.post(json={"paths": [str(Path(image_path).resolve())]})
+    if DETECTOR_TRANSPORT == "multipart":
+        with open(image_path, "rb") as image_file:
+            return detector_client.post(
+                files={"files": (Path(image_path).name, image_file)}
+            )
+    # Generate URL from file path
+    return detector_client.post(json={"urls": [MEDIA_BASE_URL + image_path]})
+
+
+# Send one image to the detector, returns its pixel counts and processed images
+def detect_image(image_path: str):
+    try:
+        response = post_image(image_path)
+    except httpx.HTTPStatusError as e:
+        raise DetectionError(
+            f"Error sending images to detector: {str(e)}",
+            retryable=e.response.status_code >= 500,
+        )
+    except httpx.HTTPError as e:
+        raise DetectionError(
+            f"Error sending images to detector: {str(e)}", retryable=True
+        )
+    except OSError as e:
+        raise DetectionError(f"Cannot read image {image_path}: {e}")
+
+    try:
+        detector_response = response.json()
+    except ValueError as e:
+        raise DetectionError(f"Invalid JSON response from detector service: {str(e)}")
+
+    # Extract data from the detector's response
+    results = {}
+    if isinstance(detector_response, dict):
+        results = detector_response.get("results") or {}
+    detected = results.get("detected") if isinstance(results, dict) else None
+    processed_image_urls = (
+        results.get("processed_image_urls") if isinstance(results, dict) else None
+    )
+
+    if not valid_detection(detected, processed_image_urls):
+        raise DetectionError("Invalid response structure from detector service")
+    return detected, processed_image_urls
+
+
+# Pixel counts keyed by class and a non-empty list of image URLs; anything
+# else would only fail later while storing the result
+def valid_detection(detected, processed_image_urls):
+    return (
+        isinstance(detected, dict)
+        and bool(detected)
+        and all(
+            isinstance(count, (int, float)) and not isinstance(count, bool)
+            for count in detected.values()
+        )
+        and isinstance(processed_image_urls, list)
+        and bool(processed_image_urls)
+        and all(isinstance(url, str) for url in processed_image_urls)
+    )
+
+
+def current_model_version():
+    return DETECTOR_MODEL_VERSION or detector_client.model_version()
+
+
+def get_cached_detections(db, hashes: list, model_version: str):
+    if model_version is None:
+        return {}
+    return {
+        entry.sha256: entry
+        for entry in db.scalars(
+            select(models.DetectionCache).where(
+                models.DetectionCache.sha256.in_(hashes),
+                models.DetectionCache.model_version == model_version,
+            )
+        )
+    }
+
+
+# Without a model version the entry is returned but not stored
+def cache_detection(
+    db, sha256: str, model_version: str, detected: dict, processed_image_urls: list
+):
+    entry = models.DetectionCache(
+        sha256=sha256,
+        model_version=model_version,
+        detected=detected,
+        processed_image_urls=processed_image_urls,
+    )
+    if model_version is None:
+        return entry
+    try:
+        with db.begin_nested():
+            db.add(entry)
+    except IntegrityError:
+        # Another worker cached the same image first
+        entry = get_cached_detections(db, [sha256], model_version)[sha256]
+    return entry
+
+
+# Numeric result columns from the detector's pixel counts
+def detection_metrics(detected: dict):
+    background = detected.get("Background", 0)
+    inflammatory = detected.get("Inflammatory", 0)
+    cells = detected.get("cells", 0)
+    total = background + inflammatory + cells
+    return {
+        "background_pixels": background,
+        "inflammatory_pixels": inflammatory,
+        "cell_pixels": cells,
+        "inflammatory_ratio": inflammatory / total if total else None,
+        "cell_ratio": cells / total if total else None,
+    }
+
+
+# Run the detector on images without a cached detection and store the result
+def run_detection(db, job):
+    image_data = (
+        db.query(models.CellTestImageData)
+        .filter(models.CellTestImageData.cell_test_id == job.cell_test_id)
+        .all()
+    )
+    if not image_data:
+        raise DetectionError("No images found for this cell test ID.")
+
+    image_hashes = [image_sha256(img.image) for img in image_data]
+    model_version = current_model_version()
+    if model_version is None:
+        logger.warning(
+            f"Detection job {job.id}: detector model version unknown, "
+            "not using the detection cache"
+        )
+    cached = get_cached_detections(db, image_hashes, model_version)
+
+    # Only images not seen before with this model version go to the detector
+    uncached = {}
+    for img, sha256 in zip(image_data, image_hashes):
+        if sha256 not in cached:
+            uncached.setdefault(sha256, img)
+    job.images_total = len(image_data)
+    job.images_done = sum(sha256 in cached for sha256 in image_hashes)
+    send_progress(
+        db,
+        job,
+        10,
+        f"Sending {len(uncached)} of {len(image_data)} images to detector",
+    )
+
+    # Detector calls run concurrently; the session is only used from this thread
+    futures = {
+        image_pool.submit(detect_image, img.image): sha256
+        for sha256, img in uncached.items()
+    }
+    try:
+        for done, future in enumerate(as_completed(futures), start=1):
+            sha256 = futures[future]
+            detected, processed_image_urls = future.result()
+            cached[sha256] = cache_detection(
+                db, sha256, model_version, detected, processed_image_urls
+            )
+            job.images_done += image_hashes.count(sha256)
+            send_progress(
+                db,
+                job,
+                10 + 70 * done // len(uncached),
+                f"Processed {done} of {len(uncached)} images",
+            )
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+
+    send_progress(db, job, 80, "Storing detection results")
+
+    # Add up the per image counts in upload order
+    detected = {}
+    processed_image_urls = []
+    for sha256 in image_hashes:
+        for category, pixels in cached[sha256].detected.items():
+            detected[category] = detected.get(category, 0) + pixels
+        processed_image_urls.extend(cached[sha256].processed_image_urls)
+
+    # Create the result description with full text for each category
+    result_description = (
+        f"Background: {detected.get('Background', 0)} pixels detected as background, "
+        f"Inflammatory: {detected.get('Inflammatory', 0)} pixels detected as inflammatory cells, "
+        f"Cells: {detected.get('cells', 0)} pixels classified as connective/soft tissue cells."
+    )
+
+    result = models.Result(
+        description=result_description,
+        celltest_id=job.cell_test_id,
+        **detection_metrics(detected),
+    )
+    db.add(result)
+    db.flush()
+
+    for img_url in processed_image_urls:
+        db.add(models.ResultImageData(result_id=result.id, image=img_url))
+
+    now = datetime.datetime.utcnow()
+    job.result_id = result.id
+    job.status = JOB_COMPLETED
+    job.progress = 100
+    job.message = "Data stored successfully"
+    job.updated_at = now
+    job.finished_at = now
+    db.commit()
+    return result
+
+
+image_pool = ThreadPoolExecutor(IMAGE_CONCURRENCY, thread_name_prefix="detect")
+
+
+# Returns True when the worker should back off before claiming another job
+def process_job(db, job):
+    try:
+        run_detection(db, job)
+    except CircuitOpenError as e:
+        # Not the job's fault: put it back without using up an attempt
+        db.rollback()
+        job.status = JOB_QUEUED
+        job.worker_id = None
+        job.attempts -= 1
+        job.message = f"Waiting for the detector to recover: {e}"
+        job.updated_at = datetime.datetime.utcnow()
+        db.commit()
+        logger.info(f"Detection job {job.id} requeued, detector circuit is open")
+        return True
+    except (DetectionError, SQLAlchemyError) as e:
+        retry = isinstance(e, DetectionError) and e.retryable
+        record_failure(db, job, str(e), retry)
+        logger.warning(f"Detection job {job.id} {job.status}: {e}")
+    except Exception as e:
+        # A bug in detection must not take the worker down with it
+        logger.exception(f"Detection job {job.id} failed unexpectedly: {e}")
+        record_failure(db, job, f"Unexpected error: {e!r}", retry=False)
+    return False
+
+
+# Requeue the job while it has attempts left and the error allows it,
+# otherwise fail it. If this commit fails too the job stays running and
+# requeue_stale_jobs picks it up once it goes stale.
+def record_failure(db, job, message: str, retry: bool):
+    db.rollback()
+    now = datetime.datetime.utcnow()
+    if retry and job.attempts < MAX_ATTEMPTS:
+        job.status = JOB_QUEUED
+        job.worker_id = None
+    else:
+        job.status = JOB_FAILED
+        job.finished_at = now
+    job.message = message
+    job.updated_at = now
+    db.commit()
+
+
+# Pull and process jobs until stop_event is set
+def run_worker(worker_id: str = None, stop_event: threading.Event = None):
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    stop_event = stop_event or threading.Event()
+    logger.info(f"Detection worker {worker_id} started")
+
+    while not stop_event.is_set():
+        # Leave jobs queued while the detector is known to be down
+        if detector_client.breaker.is_open():
+            stop_event.wait(POLL_INTERVAL_SECONDS)
+            continue
+
+        db = database.SessionLocal()
+        backoff = True
+        try:
+            requeue_stale_jobs(db)
+            job = claim_next_job(db, worker_id)
+            if job:
+                backoff = process_job(db, job)
+        except SQLAlchemyError as e:
+            db.rollback()
+            logger.exception(f"Detection worker {worker_id} database error: {e}")
+        except Exception as e:
+            db.rollback()
+            logger.exception(f"Detection worker {worker_id} error: {e}")
+        finally:
+            db.close()
+
+        # Only sleep when the queue was empty or the detector is unavailable
+        if backoff:
+            stop_event.wait(POLL_INTERVAL_SECONDS)
+
+
+# Record this process's circuit breaker state for GET /detector/health; the
+# API process never calls the detector itself, so its own breaker says nothing
+def publish_heartbeat(db, process_id: str):
+    circuit = detector_client.breaker.snapshot()
+    db.merge(
+        models.DetectorWorker(
+            id=process_id,
+            circuit_state=circuit["state"],
+            failures=circuit["failures"],
+            last_error=circuit["last_error"],
+            opened_at=circuit["opened_at"],
+            heartbeat_at=datetime.datetime.utcnow(),
+        )
+    )
+    db.commit()
+
+
+# Publish heartbeats until stop_event is set, then remove this process's row
+def run_heartbeat(process_id: str, stop_event: threading.Event):
+    while not stop_event.is_set():
+        db = database.SessionLocal()
+        try:
+            publish_heartbeat(db, process_id)
+        except Exception as e:
+            db.rollback()
+            logger.exception(f"Detection worker {process_id} heartbeat failed: {e}")
+        finally:
+            db.close()
+        stop_event.wait(HEARTBEAT_INTERVAL_SECONDS)
+
+    db = database.SessionLocal()
+    try:
+        db.execute(
+            delete(models.DetectorWorker).where(models.DetectorWorker.id == process_id)
+        )
+        db.commit()
+    except SQLAlchemyError as e:
+        logger.warning(f"Could not remove heartbeat of {process_id}: {e}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Run detection job workers")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=int(os.getenv("DETECTION_WORKERS", "1")),
+        help="number of worker threads in this process",
+    )
+    args = parser.parse_args()
+
+    stop = threading.Event()
+    process_id = f"{socket.gethostname()}:{os.getpid()}"
+    threads = [
+        threading.Thread(
+            target=run_worker,
+            args=(f"{process_id}:{i}", stop),
+            daemon=True,
+        )
+        for i in range(args.concurrency)
+    ]
+    heartbeat = threading.Thread(
+        target=run_heartbeat, args=(process_id, stop), daemon=True
+    )
+    for thread in [*threads, heartbeat]:
+        thread.start()
+
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        stop.set()
+        heartbeat.join(HEARTBEAT_INTERVAL_SECONDS)
@@ -0,0 +1,249 @@
+import asyncio
+import datetime
+import logging
+import os
+import random
+import threading
+import time
+from urllib.parse import urljoin
+
+import httpx
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DETECTOR_URL = os.getenv("DETECTOR_URL", "http://127.0.0.1:9000/process_images/")
+DETECTOR_HEALTH_URL = os.getenv(
+    "DETECTOR_HEALTH_URL", urljoin(DETECTOR_URL, "/health")
+)
+
+# Connection pool and timeouts (seconds)
+DETECTOR_MAX_CONNECTIONS = int(os.getenv("DETECTOR_MAX_CONNECTIONS", "10"))
+DETECTOR_CONNECT_TIMEOUT = float(os.getenv("DETECTOR_CONNECT_TIMEOUT", "5"))
+DETECTOR_READ_TIMEOUT = float(os.getenv("DETECTOR_READ_TIMEOUT", "120"))
+DETECTOR_HEALTH_TIMEOUT = float(os.getenv("DETECTOR_HEALTH_TIMEOUT", "3"))
+
+# Attempts per call, with exponential backoff and full jitter between them
+DETECTOR_ATTEMPTS = int(os.getenv("DETECTOR_ATTEMPTS", "3"))
+DETECTOR_BACKOFF = float(os.getenv("DETECTOR_BACKOFF", "0.5"))
+DETECTOR_BACKOFF_MAX = float(os.getenv("DETECTOR_BACKOFF_MAX", "10"))
+
+# Calls failing in a row before the circuit opens, and how long it stays open
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("DETECTOR_BREAKER_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("DETECTOR_BREAKER_RESET", "30"))
+
+# Circuit breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    # True while calls should not even be attempted, including while the
+    # half open trial call is still out
+    def is_open(self):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                return True
+            return (
+                self.state == OPEN
+                and time.monotonic() - self.opened_at < self.reset_timeout
+            )
+
+    # Closed: every call goes through. Open: none until the reset timeout,
+    # then a single trial call (half open) decides whether to close again.
+    def allow_request(self):
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if (
+                self.state == OPEN
+                and time.monotonic() - self.opened_at >= self.reset_timeout
+            ):
+                self.state = HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info("Detector circuit closed")
+            self.state = CLOSED
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self, error: Exception):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(f"Detector circuit opened: {error}")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    # The trial call ended without an answer from the detector (e.g. it was
+    # cancelled); open again so a later call gets the next trial
+    def abort_trial(self, error: BaseException):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.last_error = str(error) or type(error).__name__
+
+    # opened_at is converted to wall clock UTC so other processes can read it
+    def snapshot(self):
+        with self._lock:
+            opened_at = None
+            if self.opened_at is not None:
+                opened_at = datetime.datetime.utcnow() - datetime.timedelta(
+                    seconds=time.monotonic() - self.opened_at
+                )
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "last_error": self.last_error,
+                "opened_at": opened_at,
+            }
+
+
+def is_retryable(error: Exception):
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+# One pooled httpx.AsyncClient per process. It lives on a private event loop
+# thread so the threaded detection workers and the API can share it.
+class DetectorClient:
+    def __init__(self, breaker: CircuitBreaker):
+        self.breaker = breaker
+        self._client = None
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._loop.run_forever, name="detector-client", daemon=True
+                ).start()
+            return self._loop
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(
+                    DETECTOR_READ_TIMEOUT, connect=DETECTOR_CONNECT_TIMEOUT
+                ),
+                limits=httpx.Limits(
+                    max_connections=DETECTOR_MAX_CONNECTIONS,
+                    max_keepalive_connections=DETECTOR_MAX_CONNECTIONS,
+                ),
+            )
+        return self._client
+
+    def submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._ensure_loop())
+
+    async def _post(self, url: str, **kwargs):
+        if not self.breaker.allow_request():
+            raise CircuitOpenError("Detector circuit is open, not sending request")
+
+        try:
+            return await self._send(url, **kwargs)
+        except httpx.HTTPError:
+            # _send has already recorded the outcome
+            raise
+        except BaseException as e:
+            # Anything else, cancellation included, must not leave a half open
+            # trial unsettled or the circuit would reject calls for good
+            self.breaker.abort_trial(e)
+            raise
+
+    async def _send(self, url: str, **kwargs):
+        for attempt in range(1, DETECTOR_ATTEMPTS + 1):
+            # Uploaded files are read again from the start on every attempt
+            for file_tuple in kwargs.get("files", {}).values():
+                file_tuple[1].seek(0)
+            try:
+                response = await self._get_client().post(url, **kwargs)
+                response.raise_for_status()
+                self.breaker.record_success()
+                return response
+            except httpx.HTTPError as e:
+                if not is_retryable(e):
+                    # The detector answered, it just rejected this request
+                    self.breaker.record_success()
+                    raise
+                if attempt == DETECTOR_ATTEMPTS:
+                    self.breaker.record_failure(e)
+                    raise
+                delay = min(DETECTOR_BACKOFF_MAX, DETECTOR_BACKOFF * 2 ** (attempt - 1))
+                logger.info(f"Detector call failed ({e}), retry {attempt}")
+                await asyncio.sleep(random.uniform(0, delay))
+
+    # Blocking call for worker threads
+    def post(self, url: str = DETECTOR_URL, **kwargs):
+        return self.submit(self._post(url, **kwargs)).result()
+
+    async def _probe(self):
+        start = time.perf_counter()
+        try:
+            response = await self._get_client().get(
+                DETECTOR_HEALTH_URL, timeout=DETECTOR_HEALTH_TIMEOUT
+            )
+            response.raise_for_status()
+            status, error = "ok", None
+        except httpx.HTTPError as e:
+            status, error = "unreachable", str(e) or type(e).__name__
+        return {
+            "status": status,
+            "error": error,
+            "latency": time.perf_counter() - start,
+            "url": DETECTOR_HEALTH_URL,
+        }
+
+    async def _fetch_model_version(self):
+        response = await self._get_client().get(
+            DETECTOR_HEALTH_URL, timeout=DETECTOR_HEALTH_TIMEOUT
+        )
+        response.raise_for_status()
+        version = response.json().get("model_version")
+        return str(version) if version else None
+
+    # Model version the detector reports on its health URL, None when it does
+    # not say or cannot be reached. Blocking, for worker threads.
+    def model_version(self):
+        try:
+            return self.submit(self._fetch_model_version()).result()
+        except (httpx.HTTPError, ValueError, AttributeError) as e:
+            logger.warning(f"Could not read the detector model version: {e}")
+            return None
+
+    # Probe the detector's health URL. The circuit state that matters is the
+    # workers', which they publish through detection_jobs.publish_heartbeat.
+    async def health(self):
+        return await asyncio.wrap_future(self.submit(self._probe()))
+
+
+detector_client = DetectorClient(
+    CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT)
+)
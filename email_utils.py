@@ -1,6 +1,12 @@
+import atexit
+import queue
 import smtplib
+import threading
+import time
+from contextlib import contextmanager
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from typing import NamedTuple
 
 
 import os
@@ -14,26 +20,206 @@ smtp_server = os.getenv("server_name")
 smtp_port = os.getenv("server_port")
 sender_email = os.getenv("server_email")
 password = os.getenv("server_password")
+# Set server_tls=false when talking to the local stand-in (local_smtp.py)
+use_tls = os.getenv("server_tls", "true").lower() == "true"
 
+# Outbound mail tuning
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", "2"))
+EMAIL_QUEUE_SIZE = int(os.getenv("EMAIL_QUEUE_SIZE", "1000"))
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "50"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "4"))
+EMAIL_RETRY_BACKOFF = float(os.getenv("EMAIL_RETRY_BACKOFF", "2"))
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+# Pooled connections idle for longer than this are closed instead of reused
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "60"))
 
+
+class OutgoingEmail(NamedTuple):
+    email: str
+    message: str
+    attempts: int = 0
+
+
+# Keeps logged-in SMTP sessions open between batches
+class SMTPConnectionPool:
+    def __init__(self, size: int, idle_timeout: float):
+        self.idle_timeout = idle_timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        server = smtplib.SMTP(smtp_server, smtp_port, timeout=SMTP_TIMEOUT)
+        if use_tls:
+            server.starttls()
+        if password:
+            server.login(sender_email, password)
+        return server
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+    # Reuse the most recently used live session, or open a new one
+    def _checkout(self):
+        while True:
+            try:
+                server, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - last_used < self.idle_timeout:
+                try:
+                    if server.noop()[0] == 250:
+                        return server
+                except (smtplib.SMTPException, OSError):
+                    pass
+            self._close(server)
+
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            server = self._checkout()
+            try:
+                yield server
+            except BaseException:
+                # The session may be in an unknown state, don't hand it out again
+                self._close(server)
+                raise
+            self._idle.put((server, time.monotonic()))
+
+    def close_all(self):
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(server)
+
+
+# Bounded in-process queue of outgoing mail drained by background threads
+class Mailer:
+    def __init__(self, pool: SMTPConnectionPool, workers: int, queue_size: int):
+        self.pool = pool
+        self.workers = workers
+        self.queue = queue.Queue(queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._run, name=f"mailer-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            atexit.register(self.stop)
+
+    # Wait for queued mail to go out, then close the pooled sessions
+    def stop(self, timeout: float = 10):
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self.queue.put(None)
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        self.pool.close_all()
+
+    def submit(self, item: OutgoingEmail):
+        self.start()
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except queue.Full:
+            print(f"Failed to send email to {item.email}: mail queue is full")
+            return False
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            # Send whatever else is already waiting over the same session
+            batch = [item]
+            while len(batch) < EMAIL_BATCH_SIZE:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self.queue.put(None)
+                    break
+                batch.append(item)
+            self._send_batch(batch)
+
+    def _send_batch(self, batch: list):
+        pending = list(batch)
+        try:
+            with self.pool.connection() as server:
+                while pending:
+                    item = pending[0]
+                    try:
+                        server.sendmail(sender_email, item.email, item.message)
+                        print(f"Email sent successfully to {item.email}")
+                    except smtplib.SMTPRecipientsRefused as e:
+                        print(f"Failed to send email to {item.email}: {e}")
+                    except smtplib.SMTPResponseException as e:
+                        # 4xx replies are temporary, 5xx are permanent
+                        if e.smtp_code < 500:
+                            self._retry(item, e)
+                        else:
+                            print(f"Failed to send email to {item.email}: {e}")
+                    except (smtplib.SMTPException, OSError):
+                        raise
+                    except Exception as e:
+                        # Not a delivery error, e.g. a message that cannot be
+                        # encoded; retrying would fail the same way
+                        print(f"Failed to send email to {item.email}: {e!r}")
+                    pending.pop(0)
+        except (smtplib.SMTPException, OSError) as e:
+            # Connection level failure, retry everything not sent yet
+            for item in pending:
+                self._retry(item, e)
+        except Exception as e:
+            # Broken configuration or a bug, drop the batch but keep the thread
+            for item in pending:
+                print(f"Failed to send email to {item.email}: {e!r}")
+
+    def _retry(self, item: OutgoingEmail, error: Exception):
+        attempts = item.attempts + 1
+        if attempts >= EMAIL_MAX_ATTEMPTS:
+            print(f"Failed to send email to {item.email}: {error}")
+            return
+        delay = EMAIL_RETRY_BACKOFF * 2 ** (attempts - 1)
+        print(f"Retrying email to {item.email} in {delay}s: {error}")
+        timer = threading.Timer(
+            delay, self.submit, args=(item._replace(attempts=attempts),)
+        )
+        timer.daemon = True
+        timer.start()
+
+
+mailer = Mailer(
+    SMTPConnectionPool(EMAIL_WORKERS, SMTP_IDLE_TIMEOUT),
+    EMAIL_WORKERS,
+    EMAIL_QUEUE_SIZE,
+)
+
+
+# Queue an email for delivery; returns without waiting for the SMTP server
 def send_email(email: str, subject: str, body: str):
-    try:
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(sender_email, password)
-
-        message = MIMEMultipart()
-        message["From"] = sender_email
-        message["To"] = email
-        message["Subject"] = subject
-        message.attach(MIMEText(body, "plain"))
-
-        server.sendmail(sender_email, email, message.as_string())
-        print(f"Email sent successfully to {email}")
-    except Exception as e:
-        print(f"Failed to send email to {email}: {e}")
-    finally:
-        server.quit()
+    message = MIMEMultipart()
+    message["From"] = sender_email
+    message["To"] = email
+    message["Subject"] = subject
+    message.attach(MIMEText(body, "plain"))
+
+    return mailer.submit(OutgoingEmail(email, message.as_string()))
 
 
 def send_verification_email(email: str, token: str):
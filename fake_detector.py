@@ -0,0 +1,80 @@
+import asyncio
+import hashlib
+import os
+import random
+from pathlib import Path
+from typing import List
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request, UploadFile
+
+
+# Stand-in for the detector service for local runs and tests:
+#   uvicorn fake_detector:app --port 9000
+# Pixel counts are derived from the image bytes, so the same image always
+# gives the same answer. FAKE_DETECTOR_DELAY (seconds) and
+# FAKE_DETECTOR_FAILURE_RATE (0-1) simulate a slow or flaky detector.
+FAKE_DETECTOR_DELAY = float(os.getenv("FAKE_DETECTOR_DELAY", "0"))
+FAKE_DETECTOR_FAILURE_RATE = float(os.getenv("FAKE_DETECTOR_FAILURE_RATE", "0"))
+FAKE_DETECTOR_MODEL_VERSION = os.getenv("FAKE_DETECTOR_MODEL_VERSION", "fake-1")
+
+app = FastAPI(title="Fake detector")
+
+
+def detect(content: bytes):
+    digest = hashlib.sha256(content).digest()
+    return {
+        "Background": int.from_bytes(digest[0:3], "big"),
+        "Inflammatory": int.from_bytes(digest[3:5], "big"),
+        "cells": int.from_bytes(digest[5:7], "big"),
+    }, f"media/result_images/{digest.hex()[:16]}.png"
+
+
+async def read_images(request: Request):
+    if request.headers.get("content-type", "").startswith("multipart/"):
+        form = await request.form()
+        files: List[UploadFile] = form.getlist("files")
+        return [await file.read() for file in files]
+
+    payload = await request.json()
+    if "paths" in payload:
+        return [Path(path).read_bytes() for path in payload["paths"]]
+
+    async with httpx.AsyncClient() as client:
+        responses = [await client.get(url) for url in payload.get("urls", [])]
+    return [response.content for response in responses]
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "model_version": FAKE_DETECTOR_MODEL_VERSION}
+
+
+@app.post("/process_images/")
+async def process_images(request: Request):
+    if FAKE_DETECTOR_DELAY:
+        await asyncio.sleep(FAKE_DETECTOR_DELAY)
+    if random.random() < FAKE_DETECTOR_FAILURE_RATE:
+        raise HTTPException(status_code=503, detail="Simulated detector failure")
+
+    try:
+        images = await read_images(request)
+    except (OSError, httpx.HTTPError) as e:
+        raise HTTPException(status_code=400, detail=f"Cannot read images: {e}")
+    if not images:
+        raise HTTPException(status_code=400, detail="No images provided")
+
+    detected = {"Background": 0, "Inflammatory": 0, "cells": 0}
+    processed_image_urls = []
+    for content in images:
+        counts, processed_url = detect(content)
+        for category, pixels in counts.items():
+            detected[category] += pixels
+        processed_image_urls.append(processed_url)
+
+    return {
+        "results": {
+            "detected": detected,
+            "processed_image_urls": processed_image_urls,
+        }
+    }
@@ -0,0 +1,165 @@
+from fastapi import HTTPException, status
+from functools import lru_cache
+from pydantic import create_model
+from sqlalchemy import inspect
+from sqlalchemy.orm import load_only, selectinload
+from typing import Any, List, NamedTuple, Optional, Union, get_args, get_origin
+
+
+# Columns and expanded relations picked for one level of a response
+class Selection(NamedTuple):
+    fields: tuple
+    relations: tuple = ()
+
+
+def _split(value: str):
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+# Optional[List[X]] -> X
+def _inner_schema(annotation):
+    while get_origin(annotation) in (Union, list, List):
+        annotation = next(arg for arg in get_args(annotation) if arg is not type(None))
+    return annotation
+
+
+# Schema fields backed by a column, and those backed by a relationship
+def _columns(model, schema):
+    column_attrs = inspect(model).column_attrs
+    return [name for name in schema.model_fields if name in column_attrs]
+
+
+def _relations(model, schema):
+    relationships = inspect(model).relationships
+    return {
+        name: relationships[name]
+        for name in schema.model_fields
+        if name in relationships
+    }
+
+
+def _child(relationship, schema, name):
+    return relationship.mapper.class_, _inner_schema(
+        schema.model_fields[name].annotation
+    )
+
+
+def _selection(model, schema, fields: list, paths: list, prefix: str = ""):
+    columns = _columns(model, schema)
+    if fields is None:
+        fields = columns
+    else:
+        unknown = set(fields) - set(columns)
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields {', '.join(sorted(unknown))}",
+            )
+        # The id is always returned so clients can follow up on a row
+        fields = [name for name in columns if name in fields or name == "id"]
+
+    relations = _relations(model, schema)
+    nested = {}
+    for path in paths:
+        if path[0] not in relations:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Cannot expand {prefix}{'.'.join(path)}",
+            )
+        nested.setdefault(path[0], [])
+        if len(path) > 1:
+            nested[path[0]].append(path[1:])
+
+    return Selection(
+        tuple(fields),
+        tuple(
+            (
+                name,
+                _selection(
+                    *_child(relations[name], schema, name),
+                    None,
+                    subpaths,
+                    f"{prefix}{name}.",
+                ),
+            )
+            for name, subpaths in nested.items()
+        ),
+    )
+
+
+def _load_options(model, schema, selection: Selection, extra_columns=()):
+    relations = _relations(model, schema)
+    options = [
+        load_only(*(getattr(model, name) for name in selection.fields), *extra_columns)
+    ]
+    for name, child in selection.relations:
+        child_model, child_schema = _child(relations[name], schema, name)
+        options.append(
+            selectinload(getattr(model, name)).options(
+                *_load_options(child_model, child_schema, child)
+            )
+        )
+    return options
+
+
+# The response schema with every field that was not asked for made optional,
+# so it validates the partial rows; unset fields are left out when dumping
+@lru_cache(maxsize=None)
+def _partial_schema(model, schema, selection: Selection):
+    relations = _relations(model, schema)
+    selected = dict(selection.relations)
+    overrides = {}
+    for name in schema.model_fields:
+        if name in selected:
+            child = _partial_schema(
+                *_child(relations[name], schema, name), selected[name]
+            )
+            many = relations[name].uselist
+            overrides[name] = (Optional[List[child]] if many else Optional[child], None)
+        elif name not in selection.fields:
+            overrides[name] = (Any, None)
+    if not overrides:
+        return schema
+    return create_model(schema.__name__, __base__=schema, **overrides)
+
+
+def _to_dict(row, selection: Selection):
+    data = {name: getattr(row, name) for name in selection.fields}
+    for name, child in selection.relations:
+        value = getattr(row, name)
+        if isinstance(value, list):
+            data[name] = [_to_dict(item, child) for item in value]
+        else:
+            data[name] = None if value is None else _to_dict(value, child)
+    return data
+
+
+# Sparse fieldsets for a read endpoint. ?fields=a,b picks the columns of the
+# returned rows and ?expand=rel,rel.nested the relations that are loaded and
+# nested; both default to the endpoint's full response.
+class Fieldset:
+    def __init__(self, model, schema, default_expand: tuple = ()):
+        self.model = model
+        self.schema = schema
+        self.default_expand = default_expand
+
+    def parse(self, fields: Optional[str], expand: Optional[str]):
+        paths = self.default_expand if expand is None else _split(expand)
+        return _selection(
+            self.model,
+            self.schema,
+            None if fields is None else _split(fields),
+            [path.split(".") for path in paths],
+        )
+
+    # load_only and selectinload options for the selection; extra_columns are
+    # loaded but not returned, e.g. the sort columns of a keyset page
+    def load_options(self, selection: Selection, extra_columns=()):
+        return _load_options(self.model, self.schema, selection, extra_columns)
+
+    # JSON ready dict of the selected fields of a row
+    def render(self, row, selection: Selection):
+        schema = _partial_schema(self.model, self.schema, selection)
+        return schema.model_validate(_to_dict(row, selection)).model_dump(
+            mode="json", exclude_unset=True
+        )
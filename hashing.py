@@ -1,8 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
+import asyncio
+import threading
+import time
+
+import os
+from dotenv import load_dotenv
+
+
+load_dotenv()
 
 # Creating a CryptContext instance with bcrypt hashing scheme
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Threads dedicated to bcrypt, separate from the request threadpool
+HASHING_WORKERS = int(os.getenv("HASHING_WORKERS", str(os.cpu_count() or 2)))
+# Hashes allowed to wait for a free thread before new ones are rejected
+HASHING_MAX_QUEUE = int(os.getenv("HASHING_MAX_QUEUE", "64"))
+
+
+# Bounded executor for password hashing with basic metrics
+class HashingPool:
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="bcrypt"
+        )
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+
+    async def run(self, func, *args):
+        with self._lock:
+            if self.in_flight >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many password requests, please retry",
+                    headers={"Retry-After": "1"},
+                )
+            self.in_flight += 1
+
+        start_time = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            elapsed = time.perf_counter() - start_time
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+                self.total_seconds += elapsed
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "queued": max(self.in_flight - self.workers, 0),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_seconds": (
+                    self.total_seconds / self.completed if self.completed else 0.0
+                ),
+            }
+
+
+hashing_pool = HashingPool(HASHING_WORKERS, HASHING_MAX_QUEUE)
+
 
 # hashing password
 class Hashing:
@@ -12,3 +82,10 @@ class Hashing:
 
     def verify(hashed_password, plain_password):
         return pwd_context.verify(plain_password, hashed_password)
+
+    # Async variants used by the endpoints, run on hashing_pool
+    async def bcrypt_async(password: str):
+        return await hashing_pool.run(Hashing.bcrypt, password)
+
+    async def verify_async(hashed_password, plain_password):
+        return await hashing_pool.run(Hashing.verify, hashed_password, plain_password)
@@ -0,0 +1,99 @@
+import argparse
+import socketserver
+import threading
+from email import message_from_bytes
+
+
+# Minimal SMTP server for local runs and tests; keeps messages in memory
+# instead of delivering them. Point the app at it with
+# server_name=127.0.0.1, server_port=1025 and server_tls=false.
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.reply("220 localhost local SMTP stand-in")
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 localhost")
+            elif verb == "MAIL":
+                sender, recipients = command.split(":", 1)[1].strip(), []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                recipients.append(command.split(":", 1)[1].strip())
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                self.server.store(sender, recipients, self.read_data())
+                sender, recipients = None, []
+                self.reply("250 OK")
+            elif verb in ("RSET", "NOOP"):
+                if verb == "RSET":
+                    sender, recipients = None, []
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+    def read_data(self):
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if not line or line in (b".\r\n", b".\n"):
+                return b"".join(lines)
+            # Undo dot-stuffing
+            lines.append(line[1:] if line.startswith(b"..") else line)
+
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 1025, verbose=False):
+        super().__init__((host, port), SMTPHandler)
+        self.verbose = verbose
+        self.messages = []
+        self._lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def store(self, sender: str, recipients: list, data: bytes):
+        message = message_from_bytes(data)
+        with self._lock:
+            self.messages.append(message)
+        if self.verbose:
+            print(f"Mail from {sender} to {', '.join(recipients)}: {message['Subject']}")
+
+    # Serve from a background thread, e.g. `with LocalSMTPServer(port=0) as smtp:`
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local SMTP stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    args = parser.parse_args()
+
+    server = LocalSMTPServer(args.host, args.port, verbose=True)
+    print(f"Local SMTP server listening on {args.host}:{server.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
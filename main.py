@@ -1,5 +1,6 @@
 import profile
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.staticfiles import StaticFiles
 from database import engine
@@ -13,9 +14,11 @@ from routers import (
     patients,
     cell_tests,
     profile,
+    maintenance,
 )
 import models as models
 import cleanup
+from scheduler import scheduler
 import os
 import logging
 
@@ -23,15 +26,21 @@ from middleware.advanced import AdvancedMiddleWare
 
 from middleware.hospital_access import HospitalAccessMiddleware
 
+from middleware.compression import CompressionMiddleware
+
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+# orjson for every JSON response; large lists return responses.ModelResponse
+app = FastAPI(default_response_class=ORJSONResponse)
 
 models.Base.metadata.create_all(engine)
 
+# Start leader election for the scheduled maintenance jobs
+scheduler.start()
+
 app.mount("/static", StaticFiles(directory="static"), name="static")
 app.mount("/media", StaticFiles(directory="media"), name="media")
 
@@ -53,6 +62,8 @@ app.add_middleware(
 
 app.add_middleware(AdvancedMiddleWare)
 app.add_middleware(HospitalAccessMiddleware)
+# Outermost, so every response above the size threshold is compressed
+app.add_middleware(CompressionMiddleware)
 
 
 # Include routers
@@ -65,6 +76,7 @@ app.include_router(patients.router)
 app.include_router(cell_tests.router)
 app.include_router(atomic_transaction.router)
 app.include_router(profile.router)
+app.include_router(maintenance.router)
 
 #run microservices
 app.include_router(atomic_transaction.router)
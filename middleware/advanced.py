@@ -1,73 +1,85 @@
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.responses import Response
-from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import time
 import logging
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
+# exempt paths
+EXEMPT_PATHS = {
+    "/openapi.json",
+    "/docs",
+    "/redoc",
+    "/favicon.ico",
+}
+EXEMPT_PREFIXES = ("/static/",)
 
-# middleware class
-class AdvancedMiddleWare(BaseHTTPMiddleware):
-    def __init__(self, app):
-        super().__init__(app)
 
-        # exempt paths
-        self.exempt_paths = [
-            "/openapi.json",
-            "/docs",
-            "/redoc",
-            "/favicon.ico",
-            "/static/CancerDetector/css/bootstrap.css",
-            "/static/CancerDetector/js/jquery-slim.js",
-            "/static/CancerDetector/js/popper.js",
-            "/static/CancerDetector/js/bootstrap.js",
-        ]
+# middleware class, plain ASGI so request bodies are streamed through untouched
+class AdvancedMiddleWare:
+    def __init__(self, app: ASGIApp):
+        self.app = app
 
-    async def dispatch(self, request: Request, call_next):
-        # Extract path from request URL
-        path = request.url.path
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        path = scope["path"]
+        logged = path not in EXEMPT_PATHS and not path.startswith(EXEMPT_PREFIXES)
 
         # Skip processing for exempt paths
-        if path not in self.exempt_paths:
-            # Log details of incoming request
-            logger.info(f"Incoming request: {request.method} {path}")
-            logger.debug(f"Request headers: {request.headers}")
+        if logged:
+            # Log details of incoming request; bodies are never read here
+            headers = Headers(scope=scope)
+            logger.info(f"Incoming request: {method} {path}")
+            logger.debug(f"Request headers: {headers}")
+            if method in ("POST", "PUT", "PATCH"):
+                logger.debug(
+                    f"Request body length: {headers.get('content-length', 'unknown')}"
+                )
 
-            # Log request body for POST, PUT, PATCH requests
-            if request.method in ["POST", "PUT", "PATCH"]:
-                logger.debug(f"Request body: {await request.body()}")
+        # Measure start time
+        start_time = time.perf_counter()
+        status_code = None
 
-        try:
-            # Measure start time
-            start_time = time.time()
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # Add processing time header to the response
+                process_time = time.perf_counter() - start_time
+                MutableHeaders(scope=message).append(
+                    "X-Process-Time", str(process_time)
+                )
+            await send(message)
 
+        try:
             # Call the next middleware in the chain or handler
-            response = await call_next(request)
-
-            # Calculate processing time
-            process_time = time.time() - start_time
-
-            # Add custom headers to response
-            custom_headers = {"X-Process-Time": str(process_time)}
-            for header, value in custom_headers.items():
-                response.headers.append(header, value)
-
-            # Log details of response
-            logger.info(
-                f"Response: {response.status_code} for {request.method} {path} took {process_time:.6f} seconds"
-            )
-
-            return response
+            await self.app(scope, receive, send_wrapper)
         except Exception as e:
             # Log and handle exceptions
             logger.exception(f"Error processing request: {e}")
 
+            # The response has already started, nothing more can be sent
+            if status_code is not None:
+                raise
+
             # Return internal server error response
-            return Response(
+            status_code = 500
+            response = Response(
                 content="Internal Server Error",
                 status_code=500,
-                headers=Headers({"Content-Type": "text/plain"}),
+                media_type="text/plain",
+            )
+            await response(scope, receive, send)
+
+        # Log details of response
+        if logged:
+            process_time = time.perf_counter() - start_time
+            logger.info(
+                f"Response: {status_code} for {method} {path} took {process_time:.6f} seconds"
             )
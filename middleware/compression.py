@@ -0,0 +1,128 @@
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Smaller bodies are sent as they are
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+# Brotli 4-5 compresses about as fast as gzip 6 and noticeably smaller
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/html", "text/plain", "text/css")
+ETAG_SUFFIXES = ("-br", "-gzip")
+
+
+def accepted_encodings(headers: Headers):
+    accepted = set()
+    for part in headers.get("accept-encoding", "").split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def choose_encoding(headers: Headers):
+    accepted = accepted_encodings(headers)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+# Each encoding is its own representation, so compressed responses get their
+# own ETag ("abc" -> "abc-gzip"). The suffix is taken off If-None-Match again
+# before the request reaches the app, which only knows the plain ETag.
+# Returns the suffix that was removed, if any.
+def strip_etag_suffixes(scope: Scope):
+    headers = []
+    stripped = None
+    for name, value in scope["headers"]:
+        if name == b"if-none-match":
+            for suffix in ETAG_SUFFIXES:
+                marker = f'{suffix}"'.encode()
+                if marker in value:
+                    value = value.replace(marker, b'"')
+                    stripped = suffix
+        headers.append((name, value))
+    scope["headers"] = headers
+    return stripped
+
+
+# gzip/brotli for complete responses above COMPRESSION_MIN_SIZE. Streamed
+# responses (event streams, files) are passed through untouched.
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        etag_suffix = strip_etag_suffixes(scope)
+        encoding = choose_encoding(Headers(scope=scope))
+        start_message = None
+
+        async def send_wrapper(message: Message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                # Held back until the body shows whether it is worth compressing
+                start_message = message
+                return
+            if start_message is None:
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            headers = MutableHeaders(scope=start)
+            etag = headers.get("etag")
+            # A 304 repeats the ETag of the representation the client holds
+            if start["status"] == 304 and etag_suffix and etag and etag.endswith('"'):
+                headers["ETag"] = f'{etag[:-1]}{etag_suffix}"'
+            body = message.get("body", b"")
+            compressible = "content-encoding" not in headers and headers.get(
+                "content-type", ""
+            ).startswith(COMPRESSIBLE_TYPES)
+            if compressible:
+                headers.add_vary_header("Accept-Encoding")
+            if (
+                compressible
+                and encoding is not None
+                and not message.get("more_body", False)
+                and len(body) >= COMPRESSION_MIN_SIZE
+            ):
+                body = compress(body, encoding)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                if etag and etag.endswith('"'):
+                    headers["ETag"] = f'{etag[:-1]}-{encoding}"'
+                message = {**message, "body": body}
+            await send(start)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,41 +1,46 @@
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
+from starlette.datastructures import Headers
 from starlette.responses import Response
-import jwt
-from jwt.exceptions import InvalidTokenError
+from starlette.types import ASGIApp, Receive, Scope, Send
+from jose import JWTError
+from JWTtoken import decode_access_token
 
+# Documentation endpoints skip the access check
+EXEMPT_PATHS = {"/openapi.json"}
+EXEMPT_PREFIXES = ("/docs", "/redoc")
 
-class HospitalAccessMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        print("Request received:", request.method, request.url)
+
+class HospitalAccessMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        print("Request received:", scope["method"], path)
         current_user = None
-        if (
-            request.url.path.startswith("/docs")
-            or request.url.path.startswith("/redoc")
-            or request.url.path == "/openapi.json"
-        ):
-            print("Skipping middleware for documentation endpoint:", request.url.path)
-            response = await call_next(request)
-            return response
+        if path in EXEMPT_PATHS or path.startswith(EXEMPT_PREFIXES):
+            print("Skipping middleware for documentation endpoint:", path)
+            await self.app(scope, receive, send)
+            return
 
         try:
             # Extract the token from the request headers
-            authorization_header = request.headers.get("Authorization")
+            authorization_header = Headers(scope=scope).get("Authorization")
             if authorization_header:
                 parts = authorization_header.split()
 
                 if len(parts) == 2 and parts[0] == "Bearer":
                     token = parts[1]
-                    # Decode the token
-                    decoded_token = jwt.decode(
-                        token,
-                        "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7",
-                        algorithms=["HS256"],
-                    )
+                    # Decode the token and share it with get_current_user
+                    decoded_token = decode_access_token(token)
                     print(f"decoded token: {decoded_token}")
                     current_user = decoded_token
+                    scope.setdefault("state", {})["token_payload"] = decoded_token
 
-        except InvalidTokenError as e:
+        except JWTError as e:
             print("Invalid token:", e)
             pass
         except Exception as e:
@@ -44,13 +49,16 @@ class HospitalAccessMiddleware(BaseHTTPMiddleware):
 
         if current_user and current_user.get("is_admin"):
             print("Admin user detected. Allowing access.")
-            response = await call_next(request)
-            return response
+            await self.app(scope, receive, send)
+            return
 
+        # Tokens are decoded with the app's SECRET_KEY, so this applies to every
+        # valid token. The old hard-coded key never matched and it never ran.
         if current_user and not current_user.get("hospital_id"):
             print("Non-admin user without hospital affiliation. Access denied.")
-            return Response("Forbidden", status_code=403)
+            response = Response("Forbidden", status_code=403)
+            await response(scope, receive, send)
+            return
 
         print("Request processing complete.")
-        response = await call_next(request)
-        return response
+        await self.app(scope, receive, send)
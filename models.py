@@ -1,4 +1,5 @@
 from sqlalchemy import (
+    BigInteger,
     Column,
     Integer,
     String,
@@ -7,7 +8,12 @@ from sqlalchemy import (
     DateTime,
     Text,
     Date,
+    Float,
+    Index,
+    JSON,
+    UniqueConstraint,
     func,
+    text,
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
@@ -19,6 +25,10 @@ from database import Base
 # User model
 class User(Base):
     __tablename__ = "users"
+    # Row count and latest change per hospital back the user list ETag
+    __table_args__ = (
+        Index("ix_users_hospital_updated_at", "hospital_id", "updated_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String, unique=True, index=True)
@@ -33,6 +43,13 @@ class User(Base):
     is_admin = Column(Boolean, default=False)
     is_hospital_admin = Column(Boolean, default=False)
     hospital_id = Column(Integer, ForeignKey("hospitals.id"), nullable=True)
+    updated_at = Column(
+        DateTime,
+        nullable=False,
+        default=datetime.datetime.utcnow,
+        onupdate=datetime.datetime.utcnow,
+        server_default=func.now(),
+    )
 
     hospital = relationship("Hospital", back_populates="users")
 
@@ -45,7 +62,16 @@ class PasswordResetToken(Base):
     email = Column(String, index=True)
     token = Column(String, unique=True, index=True)
     used = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+    # Lets the cleanup job find used tokens without scanning the table
+    __table_args__ = (
+        Index(
+            "ix_password_reset_tokens_used",
+            "used",
+            postgresql_where=text("used"),
+        ),
+    )
 
 
 # Hospital model
@@ -65,6 +91,18 @@ class Hospital(Base):
 # Patient model
 class Patient(Base):
     __tablename__ = "lab_patient"
+    __table_args__ = (
+        Index(
+            "ix_lab_patient_hospital_name",
+            "hospital_id",
+            "last_name",
+            "first_name",
+            "id",
+        ),
+        Index("ix_lab_patient_hospital_birth_date", "hospital_id", "birth_date"),
+        Index("ix_lab_patient_hospital_created_at", "hospital_id", "created_at"),
+        Index("ix_lab_patient_hospital_updated_at", "hospital_id", "updated_at"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     first_name = Column(String(255), nullable=False)
@@ -72,6 +110,19 @@ class Patient(Base):
     email = Column(String(254), nullable=False, unique=True)
     phone = Column(String(255), nullable=True)
     birth_date = Column(Date, nullable=False)
+    created_at = Column(
+        DateTime,
+        nullable=False,
+        default=datetime.datetime.utcnow,
+        server_default=func.now(),
+    )
+    updated_at = Column(
+        DateTime,
+        nullable=False,
+        default=datetime.datetime.utcnow,
+        onupdate=datetime.datetime.utcnow,
+        server_default=func.now(),
+    )
     hospital_id = Column(Integer, ForeignKey("hospitals.id"), nullable=True)
 
     address = relationship("Address", uselist=False, back_populates="patient")
@@ -96,6 +147,11 @@ class Address(Base):
 # Cell Test model
 class CellTest(Base):
     __tablename__ = "lab_celltest"
+    __table_args__ = (
+        Index(
+            "ix_lab_celltest_patient_created_at", "patient_id", "created_at", "id"
+        ),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     title = Column(String(255), nullable=False)
@@ -115,6 +171,16 @@ class CellTest(Base):
 # Result model
 class Result(Base):
     __tablename__ = "lab_result"
+    __table_args__ = (
+        Index("ix_lab_result_created_at", "created_at"),
+        # Analytics scan results per cell test and date without the table
+        Index(
+            "ix_lab_result_celltest_created_at",
+            "celltest_id",
+            "created_at",
+            postgresql_include=["inflammatory_ratio", "cell_ratio"],
+        ),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     description = Column(Text, nullable=True)
@@ -122,6 +188,12 @@ class Result(Base):
     celltest_id = Column(
         UUID(as_uuid=True), ForeignKey("lab_celltest.id"), nullable=False
     )
+    # Detector pixel counts and their share of all detected pixels
+    background_pixels = Column(BigInteger, nullable=True)
+    inflammatory_pixels = Column(BigInteger, nullable=True)
+    cell_pixels = Column(BigInteger, nullable=True)
+    inflammatory_ratio = Column(Float, nullable=True, index=True)
+    cell_ratio = Column(Float, nullable=True, index=True)
 
     cell_test = relationship("CellTest", back_populates="results")
     result_images = relationship("ResultImageData", back_populates="result")
@@ -132,7 +204,7 @@ class CellTestImageData(Base):
     __tablename__ = "lab_celltestimagedata"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    image = Column(String(100), nullable=False)
+    image = Column(String(255), nullable=False, index=True)
     cell_test_id = Column(
         UUID(as_uuid=True), ForeignKey("lab_celltest.id"), nullable=False
     )
@@ -145,7 +217,99 @@ class ResultImageData(Base):
     __tablename__ = "lab_resultimagedata"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    image = Column(String(100), nullable=False)
+    image = Column(String(255), nullable=False, index=True)
     result_id = Column(UUID(as_uuid=True), ForeignKey("lab_result.id"), nullable=False)
 
     result = relationship("Result", back_populates="result_images")
+
+
+# Detection Job model
+class DetectionJob(Base):
+    __tablename__ = "lab_detectionjob"
+    __table_args__ = (
+        Index("ix_lab_detectionjob_status_created_at", "status", "created_at"),
+        Index("ix_lab_detectionjob_cell_test_updated_at", "cell_test_id", "updated_at"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    status = Column(String(20), nullable=False, default="queued", index=True)
+    progress = Column(Integer, nullable=False, default=0)
+    message = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    images_total = Column(Integer, nullable=False, default=0)
+    images_done = Column(Integer, nullable=False, default=0)
+    worker_id = Column(String(255), nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    cell_test_id = Column(
+        UUID(as_uuid=True), ForeignKey("lab_celltest.id"), nullable=False
+    )
+    result_id = Column(UUID(as_uuid=True), ForeignKey("lab_result.id"), nullable=True)
+    batch_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("lab_detectionbatch.id"),
+        nullable=True,
+        index=True,
+    )
+
+    cell_test = relationship("CellTest")
+    result = relationship("Result")
+    batch = relationship("DetectionBatch", back_populates="jobs")
+
+
+# Group of detection jobs submitted together
+class DetectionBatch(Base):
+    __tablename__ = "lab_detectionbatch"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    requested_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    total_jobs = Column(Integer, nullable=False, default=0)
+
+    jobs = relationship("DetectionJob", back_populates="batch")
+
+
+# Detector output for one image content hash and model version
+class DetectionCache(Base):
+    __tablename__ = "lab_detectioncache"
+    __table_args__ = (UniqueConstraint("sha256", "model_version"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    sha256 = Column(String(64), nullable=False)
+    model_version = Column(String(100), nullable=False)
+    detected = Column(JSON, nullable=False)
+    processed_image_urls = Column(JSON, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+
+# Circuit breaker state published by each detection worker process
+class DetectorWorker(Base):
+    __tablename__ = "lab_detectorworker"
+
+    id = Column(String(255), primary_key=True)
+    circuit_state = Column(String(20), nullable=False)
+    failures = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    opened_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(
+        DateTime, nullable=False, default=datetime.datetime.utcnow, index=True
+    )
+
+
+# Scheduled job run history
+class ScheduledJobRun(Base):
+    __tablename__ = "scheduled_job_runs"
+    __table_args__ = (
+        Index("ix_scheduled_job_runs_job_name_started_at", "job_name", "started_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_name = Column(String(100), nullable=False)
+    host = Column(String(255), nullable=False)
+    status = Column(String(20), nullable=False)
+    started_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+    duration = Column(Float, nullable=True)
+    message = Column(Text, nullable=True)
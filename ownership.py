@@ -0,0 +1,154 @@
+from fastapi import Depends, HTTPException, status
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import NamedTuple, Optional
+import database, models
+from JWTtoken import get_current_user
+
+
+# Objects along the hospital -> patient -> cell test -> result chain
+class Scope(NamedTuple):
+    hospital: models.Hospital
+    patient: Optional[models.Patient] = None
+    cell_test: Optional[models.CellTest] = None
+    result: Optional[models.Result] = None
+
+
+# Load the whole chain with one outer-joined query, 404 on the first missing link
+async def load_scope(
+    db: AsyncSession,
+    hospital_id: int,
+    patient_id: str = None,
+    cell_test_id: str = None,
+    result_id: str = None,
+):
+    entities = [models.Hospital]
+    joins = []
+    if patient_id is not None:
+        entities.append(models.Patient)
+        joins.append(
+            (
+                models.Patient,
+                and_(
+                    models.Patient.hospital_id == models.Hospital.id,
+                    models.Patient.id == patient_id,
+                ),
+            )
+        )
+    if cell_test_id is not None:
+        entities.append(models.CellTest)
+        joins.append(
+            (
+                models.CellTest,
+                and_(
+                    models.CellTest.patient_id == models.Patient.id,
+                    models.CellTest.id == cell_test_id,
+                ),
+            )
+        )
+    if result_id is not None:
+        entities.append(models.Result)
+        joins.append(
+            (
+                models.Result,
+                and_(
+                    models.Result.celltest_id == models.CellTest.id,
+                    models.Result.id == result_id,
+                ),
+            )
+        )
+
+    query = select(*entities)
+    for target, onclause in joins:
+        query = query.outerjoin(target, onclause)
+    row = (await db.execute(query.where(models.Hospital.id == hospital_id))).first()
+
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Hospital not found"
+        )
+
+    scope = Scope(*row)
+    if patient_id is not None and scope.patient is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found"
+        )
+    if cell_test_id is not None and scope.cell_test is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Cell test not found"
+        )
+    if result_id is not None and scope.result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Result not found"
+        )
+    return scope
+
+
+def check_hospital_permission(current_user: models.User, hospital_id: int):
+    if not current_user.is_admin and current_user.hospital_id != hospital_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Permission denied"
+        )
+
+
+# For routes that address a cell test by id alone: 404 when it does not exist
+# or belongs to another hospital than the user's
+async def check_cell_test_access(
+    db: AsyncSession, current_user: models.User, cell_test_id
+):
+    row = (
+        await db.execute(
+            select(models.Patient.hospital_id)
+            .join(models.CellTest, models.CellTest.patient_id == models.Patient.id)
+            .where(models.CellTest.id == cell_test_id)
+        )
+    ).first()
+    if row is None or (
+        not current_user.is_admin and current_user.hospital_id != row.hospital_id
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Cell test not found"
+        )
+
+
+# Dependencies for routes nested under /hospital/{hospital_id}
+async def get_hospital_scope(
+    hospital_id: int,
+    db: AsyncSession = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    check_hospital_permission(current_user, hospital_id)
+    return await load_scope(db, hospital_id)
+
+
+async def get_patient_scope(
+    hospital_id: int,
+    patient_id: str,
+    db: AsyncSession = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    check_hospital_permission(current_user, hospital_id)
+    return await load_scope(db, hospital_id, patient_id)
+
+
+async def get_cell_test_scope(
+    hospital_id: int,
+    patient_id: str,
+    cell_test_id: str,
+    db: AsyncSession = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    check_hospital_permission(current_user, hospital_id)
+    return await load_scope(db, hospital_id, patient_id, cell_test_id)
+
+
+async def get_result_scope(
+    hospital_id: int,
+    patient_id: str,
+    cell_test_id: str,
+    result_id: str,
+    db: AsyncSession = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    check_hospital_permission(current_user, hospital_id)
+    return await load_scope(db, hospital_id, patient_id, cell_test_id, result_id)
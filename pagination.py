@@ -0,0 +1,56 @@
+from fastapi import HTTPException, status
+from sqlalchemy import tuple_
+import base64
+import datetime
+import json
+
+
+# Default and maximum page sizes for list endpoints
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+# Opaque cursor holding the sort key of the last row on a page
+def encode_cursor(values: list):
+    raw = json.dumps([str(value) for value in values]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str, columns: list):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("cursor does not match the sort columns")
+        # encode_cursor only writes strings, anything else was not made here
+        if not all(isinstance(value, str) for value in values):
+            raise ValueError("cursor values must be strings")
+        return [_cursor_value(column, value) for column, value in zip(columns, values)]
+    except (ValueError, TypeError, AttributeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+
+
+# Turn a cursor string back into the column's python type
+def _cursor_value(column, value: str):
+    python_type = column.type.python_type
+    if python_type in (datetime.datetime, datetime.date):
+        return python_type.fromisoformat(value)
+    return python_type(value)
+
+
+# Fetch one page ordered by columns, starting after the cursor row
+async def keyset_page(db, query, columns: list, cursor: str, limit: int):
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        query = query.where(tuple_(*columns) > tuple_(*values))
+
+    # Fetch one extra row to know whether another page exists
+    rows = (await db.scalars(query.order_by(*columns).limit(limit + 1))).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(
+            [getattr(rows[-1], column.key) for column in columns]
+        )
+    return rows, next_cursor
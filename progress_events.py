@@ -0,0 +1,161 @@
+import asyncio
+import datetime
+import logging
+import os
+import uuid
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
+
+import database
+import models
+import schemas
+from detection_jobs import JOB_COMPLETED, JOB_FAILED, JOB_RUNNING
+
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# How often the API checks the database for progress of watched cell tests
+PROGRESS_POLL_INTERVAL = float(os.getenv("PROGRESS_POLL_INTERVAL", "1"))
+# Events kept per slow subscriber before the oldest are dropped
+SUBSCRIBER_QUEUE_SIZE = 100
+
+FINAL_STATUSES = (JOB_COMPLETED, JOB_FAILED)
+
+
+# Progress event for a detection job, with a naive ETA from the image rate
+def progress_event(job: models.DetectionJob):
+    eta_seconds = None
+    if job.status == JOB_RUNNING and job.started_at and job.images_done:
+        elapsed = (datetime.datetime.utcnow() - job.started_at).total_seconds()
+        remaining = job.images_total - job.images_done
+        eta_seconds = max(0.0, elapsed / job.images_done * remaining)
+    event = schemas.DetectionProgress.model_validate(job)
+    event.eta_seconds = eta_seconds
+    return event.model_dump(mode="json")
+
+
+# In-process pub/sub, one channel per cell test. Anything offering the same
+# publish/subscribe/channels methods (e.g. a Redis backed broker) can replace it.
+class ProgressBroker:
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+
+    def channels(self):
+        return list(self._subscribers)
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str):
+        queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers[channel].add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers[channel].discard(queue)
+            if not self._subscribers[channel]:
+                del self._subscribers[channel]
+
+    def publish(self, channel: str, event: dict):
+        for queue in self._subscribers.get(channel, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+
+# Detection workers run in their own processes and record progress on the
+# job row. While anyone is subscribed, one task per API process polls those
+# rows and publishes changes, instead of every client polling the API.
+class JobProgressWatcher:
+    def __init__(self, broker: ProgressBroker, interval: float):
+        self.broker = broker
+        self.interval = interval
+        self._task = None
+        self._seen = {}
+
+    def ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while self.broker.channels():
+            try:
+                await self.poll()
+            except SQLAlchemyError as e:
+                logger.exception(f"Progress watcher database error: {e}")
+            await asyncio.sleep(self.interval)
+        self._seen.clear()
+
+    # Latest job of every watched cell test, published when its state changed.
+    # No updated_at watermark: workers stamp updated_at before committing, so
+    # commits can land out of timestamp order and a watermark would skip them.
+    async def poll(self):
+        cell_test_ids = [uuid.UUID(channel) for channel in self.broker.channels()]
+        Job = models.DetectionJob
+        latest = (
+            select(Job.cell_test_id, func.max(Job.created_at).label("created_at"))
+            .where(Job.cell_test_id.in_(cell_test_ids))
+            .group_by(Job.cell_test_id)
+            .subquery()
+        )
+        async with database.AsyncSessionLocal() as db:
+            jobs = await db.scalars(
+                select(Job).join(
+                    latest,
+                    (Job.cell_test_id == latest.c.cell_test_id)
+                    & (Job.created_at == latest.c.created_at),
+                )
+            )
+            for job in jobs:
+                key = (job.status, job.progress, job.images_done)
+                if self._seen.get(job.id) == key:
+                    continue
+                self._seen[job.id] = key
+                self.broker.publish(str(job.cell_test_id), progress_event(job))
+
+
+progress_broker = ProgressBroker()
+progress_watcher = JobProgressWatcher(progress_broker, PROGRESS_POLL_INTERVAL)
+
+
+# Current state of the latest job, then live updates until it finishes
+async def job_progress(db, cell_test_id: uuid.UUID, heartbeat: float = 15):
+    channel = str(cell_test_id)
+    async with progress_broker.subscribe(channel) as queue:
+        progress_watcher.ensure_running()
+
+        job = await db.scalar(
+            select(models.DetectionJob)
+            .where(models.DetectionJob.cell_test_id == cell_test_id)
+            .order_by(models.DetectionJob.created_at.desc())
+            .limit(1)
+        )
+        # Done with the request session, the stream can stay open for minutes
+        await db.close()
+        if job is None:
+            return
+        event = progress_event(job)
+        yield event
+        if event["status"] in FINAL_STATUSES:
+            return
+
+        last = (event["id"], event["status"], event["progress"])
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle stream
+                yield None
+                continue
+            # The watcher may repeat the state this stream started with
+            if (event["id"], event["status"], event["progress"]) == last:
+                continue
+            last = (event["id"], event["status"], event["progress"])
+            yield event
+            if event["status"] in FINAL_STATUSES:
+                return
@@ -0,0 +1,22 @@
+from functools import lru_cache
+from pydantic import TypeAdapter
+from starlette.responses import Response
+
+
+@lru_cache(maxsize=None)
+def _adapter(response_type):
+    return TypeAdapter(response_type)
+
+
+# Validates ORM rows against the response type once and writes the JSON with
+# pydantic-core. Returning it from a route skips FastAPI's own response_model
+# pass (validate, dump to dicts, encode), so keep response_model on the route
+# for the docs only.
+class ModelResponse(Response):
+    media_type = "application/json"
+
+    def __init__(self, content, response_type, status_code: int = 200, **kwargs):
+        adapter = _adapter(response_type)
+        body = adapter.dump_json(adapter.validate_python(content, from_attributes=True))
+        super().__init__(body, status_code, **kwargs)
+
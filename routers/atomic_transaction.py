@@ -1,121 +1,263 @@
-from fastapi import APIRouter, Depends, status
-from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, status
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
+from starlette.websockets import WebSocketDisconnect
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
-import requests
-from pydantic import ValidationError
-from models import CellTestImageData, Result, ResultImageData
+import models
+from models import CellTestImageData, DetectionJob
 from uuid import UUID
-from sqlalchemy.exc import SQLAlchemyError
-from typing import Any
+from detection_jobs import (
+    ACTIVE_STATUSES,
+    JOB_FAILED,
+    MAX_BATCH_SIZE,
+    WORKER_HEARTBEAT_TIMEOUT,
+    enqueue_batch,
+    enqueue_job,
+)
+from JWTtoken import (
+    get_admin_or_hospital_admin,
+    get_current_user,
+    get_user_for_token,
+)
+from ownership import check_cell_test_access
+from typing import Optional
+from detector_client import OPEN, detector_client
+from progress_events import job_progress
+import datetime
+import json
+import schemas
 
 
 router = APIRouter(tags=["Atomic-Transaction"])
 
 
-def send_progress(message: str):
-    print(message)
+# Job counts per status and the overall batch status
+async def batch_summary(db: AsyncSession, batch, status_filter: str = None):
+    counts = dict(
+        (
+            await db.execute(
+                select(DetectionJob.status, func.count())
+                .where(DetectionJob.batch_id == batch.id)
+                .group_by(DetectionJob.status)
+            )
+        ).all()
+    )
+    if any(counts.get(job_status) for job_status in ACTIVE_STATUSES):
+        batch_status = "running"
+    elif counts.get(JOB_FAILED):
+        batch_status = "completed_with_errors"
+    else:
+        batch_status = "completed"
 
-@router.post("/process-cell-test/{cell_test_id}", response_model=Any)
-def process_cell_test(cell_test_id: UUID, db: Session = Depends(get_db)):
-    try:
-        # Retrieve all image paths for the given cell_test_id from the database
-        image_data = (
-            db.query(CellTestImageData)
-            .filter(CellTestImageData.cell_test_id == cell_test_id)
-            .all()
+    jobs = select(DetectionJob).where(DetectionJob.batch_id == batch.id)
+    if status_filter:
+        jobs = jobs.where(DetectionJob.status == status_filter)
+    return {
+        "id": batch.id,
+        "created_at": batch.created_at,
+        "total_jobs": batch.total_jobs,
+        "status": batch_status,
+        "counts": counts,
+        "jobs": (await db.scalars(jobs.order_by(DetectionJob.created_at))).all(),
+    }
+
+
+# Queue detection for many cell tests at once, by id and/or hospital and date range
+@router.post(
+    "/process-cell-test/batches",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=schemas.DetectionBatch,
+)
+async def process_cell_test_batch(
+    request: schemas.DetectionBatchCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_admin_or_hospital_admin),
+):
+    if not request.cell_test_ids and request.hospital_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide cell_test_ids or hospital_id",
         )
 
-        if not image_data:
-            return JSONResponse(
-                {"error": "No images found for this cell test ID."},
-                status_code=status.HTTP_404_NOT_FOUND,
-            )
+    # Cell tests with at least one image, limited to the user's hospital
+    query = (
+        select(models.CellTest.id)
+        .join(models.Patient)
+        .where(
+            select(CellTestImageData.id)
+            .where(CellTestImageData.cell_test_id == models.CellTest.id)
+            .exists()
+        )
+    )
+    if request.cell_test_ids:
+        query = query.where(models.CellTest.id.in_(request.cell_test_ids))
+    if request.hospital_id is not None:
+        query = query.where(models.Patient.hospital_id == request.hospital_id)
+    if not current_user.is_admin:
+        query = query.where(models.Patient.hospital_id == current_user.hospital_id)
+    if request.created_after:
+        query = query.where(models.CellTest.created_at >= request.created_after)
+    if request.created_before:
+        query = query.where(models.CellTest.created_at < request.created_before)
 
-        # Generate URLs from file paths
-        base_url = "http://127.0.0.1:8000/"
-        image_urls = [base_url + img.image for img in image_data]
-
-        # Send image URLs to detector service
-        detector_url = "http://127.0.0.1:9000/process_images/"
-        payload = {"urls": image_urls}
-
-        try:
-            response = requests.post(detector_url, json=payload)
-            response.raise_for_status()  # Raises an exception for non-2xx status codes
-        except requests.exceptions.RequestException as e:
-            error_message = f"Error sending images to FastAPI: {str(e)}"
-            return JSONResponse(
-                {"error": error_message},
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
+    cell_test_ids = (await db.scalars(query.limit(MAX_BATCH_SIZE + 1))).all()
+    if not cell_test_ids:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No cell tests with images match this batch",
+        )
+    if len(cell_test_ids) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Batches are limited to {MAX_BATCH_SIZE} cell tests",
+        )
 
-        # Parse the detector response
-        try:
-            detector_response = response.json()
-            print("detector response :", detector_response)
-        except ValueError as e:
-            return JSONResponse(
-                {"error": f"Invalid JSON response from detector service: {str(e)}"},
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
+    batch, skipped = await enqueue_batch(db, cell_test_ids, current_user.id)
+    return {**await batch_summary(db, batch), "skipped": skipped}
 
-        # Extract data from the detector's response
-        results = detector_response.get("results", {})
-        detected = results.get("detected", {})
-        processed_image_urls = results.get("processed_image_urls", [])
 
-        # Validate the extracted data
-        if not detected or not processed_image_urls:
-            return JSONResponse(
-                {"error": "Invalid response structure from detector service"},
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
+# Batch status with the outcome for each cell test
+@router.get(
+    "/process-cell-test/batches/{batch_id}", response_model=schemas.DetectionBatch
+)
+async def get_detection_batch(
+    batch_id: UUID,
+    status_filter: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_admin_or_hospital_admin),
+):
+    batch = await db.scalar(
+        select(models.DetectionBatch).where(models.DetectionBatch.id == batch_id)
+    )
+    if not batch or (
+        not current_user.is_admin and batch.requested_by != current_user.id
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Detection batch not found"
+        )
+    return await batch_summary(db, batch, status_filter)
 
-        # Create the result description with full text for each category
-        result_description = (
-            f"Background: {detected.get('Background', 0)} pixels detected as background, "
-            f"Inflammatory: {detected.get('Inflammatory', 0)} pixels detected as inflammatory cells, "
-            f"Cells: {detected.get('cells', 0)} pixels classified as connective/soft tissue cells."
+
+# Queue a cell test for detection; a worker picks it up and stores the result
+@router.post(
+    "/process-cell-test/{cell_test_id}",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=schemas.DetectionJob,
+)
+async def process_cell_test(cell_test_id: UUID, db: AsyncSession = Depends(get_db)):
+    has_images = await db.scalar(
+        select(CellTestImageData.id)
+        .where(CellTestImageData.cell_test_id == cell_test_id)
+        .limit(1)
+    )
+    if not has_images:
+        return JSONResponse(
+            {"error": "No images found for this cell test ID."},
+            status_code=status.HTTP_404_NOT_FOUND,
         )
 
-        # Save results and processed images in the database
-        try:
-            # Create a new Result object
-            result = Result(
-                description=result_description, celltest_id=cell_test_id
-            )
-            db.add(result)
-            db.flush()
-
-            # Attach processed images to the result
-            for img_url in processed_image_urls:
-                processed_image = ResultImageData(
-                    result_id=result.id, image=img_url
-                )
-                db.add(processed_image)
-
-            db.commit()
-
-            # Success response
-            return JSONResponse(
-                {
-                    "message": "Data stored successfully",
-                    "result_id": str(result.id),
-                },
-                status_code=status.HTTP_201_CREATED,
-            )
+    return await enqueue_job(db, cell_test_id)
 
-        except SQLAlchemyError as e:
-            db.rollback()
-            error_message = f"Database error: {str(e)}"
-            return JSONResponse(
-                {"error": error_message},
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
 
-    except Exception as e:
-        error_message = f"Unexpected error: {str(e)}"
-        return JSONResponse(
-            {"error": error_message}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+# Status and progress of a detection job, for jobs of the user's hospital
+@router.get("/process-cell-test/jobs/{job_id}", response_model=schemas.DetectionJob)
+async def get_detection_job(
+    job_id: UUID,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    query = select(DetectionJob).where(DetectionJob.id == job_id)
+    if not current_user.is_admin:
+        query = (
+            query.join(models.CellTest, DetectionJob.cell_test_id == models.CellTest.id)
+            .join(models.Patient)
+            .where(models.Patient.hospital_id == current_user.hospital_id)
+        )
+    job = await db.scalar(query)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Detection job not found"
+        )
+    return job
+
+
+# Live progress of the latest detection job for a cell test (server-sent events)
+@router.get("/process-cell-test/{cell_test_id}/events")
+async def stream_detection_progress(
+    cell_test_id: UUID,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    await check_cell_test_access(db, current_user, cell_test_id)
+
+    async def events():
+        async for event in job_progress(db, cell_test_id):
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Same progress events over a WebSocket. Browsers cannot set headers on a
+# WebSocket, so the access token comes as ?token=
+@router.websocket("/process-cell-test/{cell_test_id}/ws")
+async def detection_progress_websocket(
+    websocket: WebSocket,
+    cell_test_id: UUID,
+    token: str,
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        current_user = await get_user_for_token(token, db)
+        await check_cell_test_access(db, current_user, cell_test_id)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    try:
+        async for event in job_progress(db, cell_test_id):
+            if event is not None:
+                await websocket.send_json(event)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+
+# Detector reachability and the circuit breaker state the worker processes
+# report, 503 while the detector is unreachable or a worker's circuit is open
+@router.get("/detector/health")
+async def get_detector_health(db: AsyncSession = Depends(get_db)):
+    health = await detector_client.health()
+    workers = (
+        await db.scalars(
+            select(models.DetectorWorker)
+            .where(
+                models.DetectorWorker.heartbeat_at
+                >= datetime.datetime.utcnow() - WORKER_HEARTBEAT_TIMEOUT
+            )
+            .order_by(models.DetectorWorker.id)
         )
+    ).all()
+    health["workers"] = [
+        {
+            "id": worker.id,
+            "circuit": worker.circuit_state,
+            "failures": worker.failures,
+            "last_error": worker.last_error,
+            "opened_at": worker.opened_at,
+            "heartbeat_at": worker.heartbeat_at,
+        }
+        for worker in workers
+    ]
+    circuit_open = any(worker.circuit_state == OPEN for worker in workers)
+    if health["status"] == "ok" and not circuit_open:
+        return health
+    return ORJSONResponse(health, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
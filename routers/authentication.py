@@ -1,9 +1,15 @@
 from fastapi import APIRouter, Depends, status, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from hashing import Hashing
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from hashing import Hashing, hashing_pool
 import database, models
-from JWTtoken import get_current_user, create_refresh_token, create_access_token
+from JWTtoken import (
+    get_current_user,
+    get_admin_user,
+    create_refresh_token,
+    create_access_token,
+)
 from jose import JWTError, jwt
 import os
 
@@ -17,24 +23,34 @@ ALGORITHM = "HS256"
 REFRESH_TOKEN_EXPIRE_DAYS = 30
 
 
+# Claims of an access token, HospitalAccessMiddleware reads is_admin and
+# hospital_id from them
+def access_token_claims(user: models.User):
+    return {
+        "sub": user.username,
+        "id": user.id,
+        "is_admin": user.is_admin,
+        "hospital_id": user.hospital_id,
+        "is_hospital_admin": user.is_hospital_admin,
+    }
+
+
 # Login
 @router.post("/login")
-def login(
+async def login(
     authentication: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(database.get_db),
+    db: AsyncSession = Depends(database.get_db),
 ):
     # Check if the user exists
-    user = (
-        db.query(models.User)
-        .filter(models.User.username == authentication.username)
-        .first()
+    user = await db.scalar(
+        select(models.User).where(models.User.username == authentication.username)
     )
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=f"Invalid username"
         )
     # Check if the password is correct
-    if not Hashing.verify(user.hashed_password, authentication.password):
+    if not await Hashing.verify_async(user.hashed_password, authentication.password):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=f"Invalid Password"
         )
@@ -45,15 +61,7 @@ def login(
         )
 
     # Generate access token
-    access_token = create_access_token(
-        data={
-            "sub": user.username,
-            "id": user.id,
-            "is_admin": user.is_admin,
-            "hospital_id": user.hospital_id,
-            "is_hospital_admin": user.is_hospital_admin,
-        }
-    )
+    access_token = create_access_token(data=access_token_claims(user))
 
     # Generate refresh token
     refresh_token = create_refresh_token(
@@ -73,23 +81,32 @@ def login(
 
 # Route to refresh access token
 @router.post("/refresh-token")
-def refresh_token(refresh_token: str):
+async def refresh_token(
+    refresh_token: str, db: AsyncSession = Depends(database.get_db)
+):
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+    )
     try:
         # Decode the refresh token
         payload = jwt.decode(refresh_token, REFRESH_SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        id: int = payload.get("id")
-        if username is None or id is None:
-            raise get_user_exception()
-
-        # Create a new access token
-        new_access_token = create_access_token({"sub": username, "id": id})
-        return {"access_token": new_access_token, "token_type": "bearer"}
     except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid refresh token",
-        )
+        raise credentials_exception
+    username: str = payload.get("sub")
+    id: int = payload.get("id")
+    if username is None or id is None:
+        raise credentials_exception
+
+    # Re-read the user so the new token carries current claims, the same
+    # ones /login issues
+    user = await db.get(models.User, id)
+    if user is None or user.username != username or user.is_verified != True:
+        raise credentials_exception
+
+    # Create a new access token
+    new_access_token = create_access_token(access_token_claims(user))
+    return {"access_token": new_access_token, "token_type": "bearer"}
 
 
 # Home route for authenticated users
@@ -98,3 +115,9 @@ async def home(current_user: models.User = Depends(get_current_user)):
     return {
         "message": f"Hello, {current_user.username}, you are successfully logged in!"
     }
+
+
+# Password hashing pool metrics
+@router.get("/hashing-stats")
+async def hashing_stats(current_admin: models.User = Depends(get_admin_user)):
+    return hashing_pool.stats()
@@ -4,21 +4,36 @@ from fastapi import (
     Depends,
     status,
     File,
+    Query,
+    Request,
     UploadFile,
 )
+from fastapi.responses import ORJSONResponse
 from datetime import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import database, schemas, models
-from JWTtoken import get_current_user
+from conditional import conditional_get
+from fieldsets import Fieldset
+from ownership import Scope, get_patient_scope, get_cell_test_scope, get_result_scope
 from pathlib import Path
-from typing import List, Union
-from save_image import save_image
-from sqlalchemy.orm import joinedload
+from typing import List, Optional, Union
+from save_image import save_images, release_image
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset_page
+from sqlalchemy import func, insert, select
 from datetime import datetime
 
 router = APIRouter(prefix="/hospital", tags=["Cell-test"])
 get_db = database.get_db
 
+cell_test_fields = Fieldset(
+    models.CellTest,
+    schemas.CellTestFetch,
+    default_expand=("results.result_images",),
+)
+result_fields = Fieldset(
+    models.Result, schemas.Result, default_expand=("result_images",)
+)
+
 
 # Create a cell test for a patient
 @router.post(
@@ -27,118 +42,88 @@ get_db = database.get_db
     response_model=schemas.CellTest,
 )
 async def create_cell_test_for_patient(
-    hospital_id: int,
-    patient_id: str,
     cell_test: schemas.CellTestCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    scope: Scope = Depends(get_patient_scope),
+    db: AsyncSession = Depends(get_db),
 ):
-    db_hospital = (
-        db.query(models.Hospital).filter(models.Hospital.id == hospital_id).first()
-    )
-    if not db_hospital:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Hospital not found"
-        )
-
-    db_patient = (
-        db.query(models.Patient)
-        .filter(
-            models.Patient.id == patient_id, models.Patient.hospital_id == hospital_id
-        )
-        .first()
-    )
-    if not db_patient:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found"
-        )
-
-    if not current_user.is_admin and current_user.hospital_id != hospital_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN, detail="Permission denied"
-        )
-
     db_cell_test = models.CellTest(
         title=cell_test.title,
         description=cell_test.description,
         updated_at=cell_test.updated_at,
         created_at=cell_test.created_at,
         detection_status=cell_test.detection_status,
-        patient_id=patient_id,
+        patient_id=scope.patient.id,
     )
     db.add(db_cell_test)
-    db.commit()
-    db.refresh(db_cell_test)
+    await db.commit()
+    await db.refresh(db_cell_test)
     return db_cell_test
 
 
-# Base URL for accessing media files
-BASE_URL = "http://127.0.0.1:8000/media/result_images"
-
-
 ##retrive all cell_tests
 @router.get(
     "/{hospital_id}/patients/{patient_id}/cell_tests",
-    response_model=List[schemas.CellTestFetch],
+    response_model=None,
+    responses={200: {"model": schemas.CellTestPage}},
 )
 async def get_cell_tests_for_patient(
-    hospital_id: int,
-    patient_id: str,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    request: Request,
+    fields: Optional[str] = None,
+    expand: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    scope: Scope = Depends(get_patient_scope),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        if not current_user.is_admin and current_user.hospital_id != hospital_id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN, detail="Permission denied"
-            )
-
-        db_hospital = (
-            db.query(models.Hospital).filter(models.Hospital.id == hospital_id).first()
+        selection = cell_test_fields.parse(fields, expand)
+
+        # Anything shown in the list, down to result images, moves the ETag
+        not_modified, headers = await conditional_get(
+            request,
+            db,
+            select(
+                func.count(models.CellTest.id.distinct()),
+                func.max(models.CellTest.updated_at),
+                func.count(models.Result.id.distinct()),
+                func.max(models.Result.created_at),
+                func.count(models.ResultImageData.id.distinct()),
+                func.max(models.ResultImageData.id),
+            )
+            .select_from(models.CellTest)
+            .outerjoin(models.Result, models.Result.celltest_id == models.CellTest.id)
+            .outerjoin(
+                models.ResultImageData,
+                models.ResultImageData.result_id == models.Result.id,
+            )
+            .where(models.CellTest.patient_id == scope.patient.id),
+        )
+        if not_modified:
+            return not_modified
+
+        # Each expanded relation comes from one extra IN query per page
+        sort_columns = [models.CellTest.created_at, models.CellTest.id]
+        query = (
+            select(models.CellTest)
+            .options(*cell_test_fields.load_options(selection, sort_columns))
+            .where(models.CellTest.patient_id == scope.patient.id)
+        )
+        cell_tests, next_cursor = await keyset_page(
+            db, query, sort_columns, cursor, limit
+        )
+        return ORJSONResponse(
+            {
+                "items": [
+                    cell_test_fields.render(cell_test, selection)
+                    for cell_test in cell_tests
+                ],
+                "next_cursor": next_cursor,
+            },
+            headers=headers,
         )
-        if not db_hospital:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Hospital not found"
-            )
-
-        db_patient = (
-            db.query(models.Patient)
-            .filter(
-                models.Patient.id == patient_id,
-                models.Patient.hospital_id == hospital_id,
-            )
-            .first()
-        )
-        if not db_patient:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found"
-            )
-
-        cell_tests = (
-            db.query(models.CellTest)
-            .options(
-                joinedload(models.CellTest.results).joinedload(
-                    models.Result.result_images
-                )
-            )
-            .filter(models.CellTest.patient_id == patient_id)
-            .all()
-        )
-
-        for cell_test in cell_tests:
-            cell_test.created_at = cell_test.created_at.date()
-            cell_test.updated_at = cell_test.updated_at.date()
-
-            if cell_test.results:  # Check if results exist
-                for result in cell_test.results:
-                    result.created_at = result.created_at.date()
-
-                    if result.result_images:  # Check if result_images exist
-                        for result_image in result.result_images:
-                            result_image.image_url = f"{BASE_URL}/{result_image.id}"
-
-        return cell_tests
 
+    except HTTPException as http_exception:
+        raise http_exception
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -152,59 +137,18 @@ async def get_cell_tests_for_patient(
     response_model=schemas.CellTest,
 )
 async def update_cell_test_for_patient(
-    hospital_id: int,
-    patient_id: str,
-    cell_test_id: str,
     cell_test_update: schemas.CellTestCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    scope: Scope = Depends(get_cell_test_scope),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        if not current_user.is_admin and current_user.hospital_id != hospital_id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN, detail="Permission denied"
-            )
-
-        db_hospital = (
-            db.query(models.Hospital).filter(models.Hospital.id == hospital_id).first()
-        )
-        if not db_hospital:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Hospital not found"
-            )
-
-        db_patient = (
-            db.query(models.Patient)
-            .filter(
-                models.Patient.id == patient_id,
-                models.Patient.hospital_id == hospital_id,
-            )
-            .first()
-        )
-        if not db_patient:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found"
-            )
-
-        db_cell_test = (
-            db.query(models.CellTest)
-            .filter(
-                models.CellTest.id == cell_test_id,
-                models.CellTest.patient_id == patient_id,
-            )
-            .first()
-        )
-        if not db_cell_test:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Cell test not found"
-            )
-
+        db_cell_test = scope.cell_test
         db_cell_test.title = cell_test_update.title
         db_cell_test.description = cell_test_update.description
         db_cell_test.updated_at = datetime.utcnow()
 
-        db.commit()
-        db.refresh(db_cell_test)
+        await db.commit()
+        await db.refresh(db_cell_test)
 
         return db_cell_test
     except HTTPException as http_exception:
@@ -222,55 +166,14 @@ async def update_cell_test_for_patient(
     response_model=schemas.CellTest,
 )
 async def delete_cell_test_for_patient(
-    hospital_id: int,
-    patient_id: str,
-    cell_test_id: str,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    scope: Scope = Depends(get_cell_test_scope),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        if not current_user.is_admin and current_user.hospital_id != hospital_id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN, detail="Permission denied"
-            )
-
-        db_hospital = (
-            db.query(models.Hospital).filter(models.Hospital.id == hospital_id).first()
-        )
-        if not db_hospital:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Hospital not found"
-            )
-
-        db_patient = (
-            db.query(models.Patient)
-            .filter(
-                models.Patient.id == patient_id,
-                models.Patient.hospital_id == hospital_id,
-            )
-            .first()
-        )
-        if not db_patient:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found"
-            )
-
-        db_cell_test = (
-            db.query(models.CellTest)
-            .filter(
-                models.CellTest.id == cell_test_id,
-                models.CellTest.patient_id == patient_id,
-            )
-            .first()
-        )
-        if not db_cell_test:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Cell test not found"
-            )
-
         # Delete the cell test
-        db.delete(db_cell_test)
-        db.commit()
+        db_cell_test = scope.cell_test
+        await db.delete(db_cell_test)
+        await db.commit()
 
         return db_cell_test
     except HTTPException as http_exception:
@@ -289,73 +192,33 @@ async def delete_cell_test_for_patient(
     response_model=List[schemas.CellTestImageDataCreate],
 )
 async def upload_images(
-    hospital_id: int,
-    patient_id: str,
-    cell_test_id: str,
     files: List[UploadFile] = File(...),  # Accept a list of files
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    scope: Scope = Depends(get_cell_test_scope),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        # Validate hospital existence
-        hospital = (
-            db.query(models.Hospital).filter(models.Hospital.id == hospital_id).first()
-        )
-        if not hospital:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Hospital not found"
-            )
-
-        # Validate patient existence
-        patient = (
-            db.query(models.Patient)
-            .filter(
-                models.Patient.id == patient_id,
-                models.Patient.hospital_id == hospital_id,
-            )
-            .first()
-        )
-        if not patient:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found"
-            )
-
-        # Validate cell test existence
-        cell_test = (
-            db.query(models.CellTest)
-            .filter(
-                models.CellTest.id == cell_test_id,
-                models.CellTest.patient_id == patient_id,
-            )
-            .first()
-        )
-        if not cell_test:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Cell test not found"
-            )
-
         # Directory for saving images
         upload_dir = Path("media/images/test_images")
         upload_dir.mkdir(parents=True, exist_ok=True)  # Ensure the directory exists
 
-        # List to hold created database objects
-        saved_images = []
-
-        # Process each file
-        for file in files:
-            # Save image
-            saved_image_path = save_image(file, upload_dir)
-
-            # Create database entry for the image
-            db_image = models.CellTestImageData(
-                image=str(saved_image_path),
-                cell_test_id=cell_test_id,
-            )
-            db.add(db_image)
-            db.commit()
-            db.refresh(db_image)
+        # Insert all image rows in a single statement and commit once
+        async def insert_rows(saved):
+            saved_images = (
+                await db.scalars(
+                    insert(models.CellTestImageData).returning(
+                        models.CellTestImageData, sort_by_parameter_order=True
+                    ),
+                    [
+                        {"image": str(image.path), "cell_test_id": scope.cell_test.id}
+                        for image in saved
+                    ],
+                )
+            ).all()
+            await db.commit()
+            return saved_images
 
-            saved_images.append(db_image)
+        # Stream each image to disk off the event loop
+        saved_images = await save_images(db, files, upload_dir, insert_rows)
 
         return saved_images  # Return all saved images
 
@@ -379,39 +242,17 @@ BASE_URL = "http://127.0.0.1:8000/media/test_images"
     response_model=List[schemas.CellTestImageData],
 )
 async def get_cell_test_images(
-    hospital_id: int,
-    patient_id: str,
-    cell_test_id: str,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    scope: Scope = Depends(get_cell_test_scope),
+    db: AsyncSession = Depends(get_db),
 ):
-    # Ensure the user has the necessary permissions
-    if not current_user.is_admin and current_user.hospital_id != hospital_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN, detail="Permission denied"
-        )
-
-    # Verify patient existence within the specified hospital
-    db_patient = (
-        db.query(models.Patient)
-        .filter(
-            models.Patient.id == patient_id,
-            models.Patient.hospital_id == hospital_id,
-        )
-        .first()
-    )
-
-    if not db_patient:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found"
-        )
-
     # Fetch cell test images associated with the specific cell test ID
     cell_test_images = (
-        db.query(models.CellTestImageData)
-        .filter(models.CellTestImageData.cell_test_id == cell_test_id)
-        .all()
-    )
+        await db.scalars(
+            select(models.CellTestImageData).where(
+                models.CellTestImageData.cell_test_id == scope.cell_test.id
+            )
+        )
+    ).all()
 
     if not cell_test_images:
         raise HTTPException(
@@ -431,58 +272,17 @@ async def get_cell_test_images(
     status_code=status.HTTP_204_NO_CONTENT,
 )
 async def delete_image(
-    hospital_id: int,
-    patient_id: str,
-    cell_test_id: str,
     image_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    scope: Scope = Depends(get_cell_test_scope),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        # Ensure the user has the necessary permissions
-        if not current_user.is_admin and current_user.hospital_id != hospital_id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN, detail="Permission denied"
-            )
-
-        # Validate patient existence within the specified hospital
-        db_patient = (
-            db.query(models.Patient)
-            .filter(
-                models.Patient.id == patient_id,
-                models.Patient.hospital_id == hospital_id,
-            )
-            .first()
-        )
-
-        if not db_patient:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found"
-            )
-
-        # Validate cell test existence
-        db_cell_test = (
-            db.query(models.CellTest)
-            .filter(
-                models.CellTest.id == cell_test_id,
-                models.CellTest.patient_id == patient_id,
-            )
-            .first()
-        )
-
-        if not db_cell_test:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Cell test not found"
-            )
-
         # Fetch the image to be deleted
-        db_image = (
-            db.query(models.CellTestImageData)
-            .filter(
+        db_image = await db.scalar(
+            select(models.CellTestImageData).where(
                 models.CellTestImageData.id == image_id,
-                models.CellTestImageData.cell_test_id == cell_test_id,
+                models.CellTestImageData.cell_test_id == scope.cell_test.id,
             )
-            .first()
         )
 
         if not db_image:
@@ -490,14 +290,12 @@ async def delete_image(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Image not found"
             )
 
-        # Delete the image file from the filesystem
-        image_path = Path(db_image.image)
-        if image_path.exists():
-            image_path.unlink()  # Remove the image file from the filesystem
-
         # Remove the image record from the database
-        db.delete(db_image)
-        db.commit()
+        await db.delete(db_image)
+        await db.commit()
+
+        # Delete the file once no other image row shares it
+        await release_image(db, db_image.image)
 
         return None  # HTTP 204 No Content
 
@@ -518,63 +316,19 @@ async def delete_image(
     response_model=schemas.Result,
 )
 async def create_result_for_cell_test(
-    hospital_id: int,
-    patient_id: str,
-    cell_test_id: str,
     result: schemas.ResultCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    scope: Scope = Depends(get_cell_test_scope),
+    db: AsyncSession = Depends(get_db),
 ):
-    # Check if hospital exists
-    db_hospital = (
-        db.query(models.Hospital).filter(models.Hospital.id == hospital_id).first()
-    )
-    if not db_hospital:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Hospital not found"
-        )
-
-    # Check if patient exists within the hospital
-    db_patient = (
-        db.query(models.Patient)
-        .filter(
-            models.Patient.id == patient_id, models.Patient.hospital_id == hospital_id
-        )
-        .first()
-    )
-    if not db_patient:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found"
-        )
-
-    # Check if cell test exists for the patient
-    db_cell_test = (
-        db.query(models.CellTest)
-        .filter(
-            models.CellTest.id == cell_test_id, models.CellTest.patient_id == patient_id
-        )
-        .first()
-    )
-    if not db_cell_test:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Cell test not found"
-        )
-
-    # Check if the current user has permission to create a result for this cell test
-    if not current_user.is_admin and current_user.hospital_id != hospital_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN, detail="Permission denied"
-        )
-
     # Create the result
     db_result = models.Result(
         description=result.description,
         created_at=result.created_at,
-        celltest_id=cell_test_id,
+        celltest_id=scope.cell_test.id,
     )
     db.add(db_result)
-    db.commit()
-    db.refresh(db_result)
+    await db.commit()
+    await db.refresh(db_result, ["result_images"])
 
     # Return the created result
     return db_result
@@ -583,45 +337,35 @@ async def create_result_for_cell_test(
 # retrive results
 @router.get(
     "/{hospital_id}/patients/{patient_id}/cell_tests/{cell_test_id}/results",
-    response_model=List[schemas.Result],
+    response_model=None,
+    responses={200: {"model": List[schemas.Result]}},
 )
 async def get_results_for_cell_test(
-    hospital_id: int,
-    patient_id: str,
-    cell_test_id: str,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    fields: Optional[str] = None,
+    expand: Optional[str] = None,
+    scope: Scope = Depends(get_cell_test_scope),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        # Check user permissions
-        if not current_user.is_admin and current_user.hospital_id != hospital_id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN, detail="Permission denied"
-            )
-
-        db_hospital = (
-            db.query(models.Hospital).filter(models.Hospital.id == hospital_id).first()
-        )
-
-        if not db_hospital or (
-            not current_user.is_admin and current_user.hospital_id != hospital_id
-        ):
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN, detail="hospital id mismatch"
-            )
-
+        selection = result_fields.parse(fields, expand)
         results = (
-            db.query(models.Result)
-            .filter(models.Result.celltest_id == cell_test_id)
-            .all()
-        )
+            await db.scalars(
+                select(models.Result)
+                .options(*result_fields.load_options(selection))
+                .where(models.Result.celltest_id == scope.cell_test.id)
+            )
+        ).all()
 
         if not results:
             raise HTTPException(
                 status_code=404, detail="No results found for this cell test ID"
             )
 
-        return results
+        return ORJSONResponse(
+            [result_fields.render(result, selection) for result in results]
+        )
+    except HTTPException as http_exception:
+        raise http_exception
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve results: {e}")
 
@@ -633,74 +377,24 @@ async def get_results_for_cell_test(
     response_model=schemas.ResultImageDataCreate,
 )
 async def upload_result_image(
-    hospital_id: int,
-    patient_id: str,
-    cell_test_id: str,
-    result_id: str,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    scope: Scope = Depends(get_result_scope),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-
-        hospital = (
-            db.query(models.Hospital).filter(models.Hospital.id == hospital_id).first()
-        )
-        if not hospital:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Hospital not found"
-            )
-
-        patient = (
-            db.query(models.Patient)
-            .filter(
-                models.Patient.id == patient_id,
-                models.Patient.hospital_id == hospital_id,
-            )
-            .first()
-        )
-        if not patient:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found"
-            )
-
-        cell_test = (
-            db.query(models.CellTest)
-            .filter(
-                models.CellTest.id == cell_test_id,
-                models.CellTest.patient_id == patient_id,
-            )
-            .first()
-        )
-        if not cell_test:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Cell test not found"
-            )
-
-        result = (
-            db.query(models.Result)
-            .filter(
-                models.Result.id == result_id,
-                models.Result.celltest_id == cell_test_id,
-            )
-            .first()
-        )
-        if not result:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Result not found"
-            )
-
         upload_dir = Path("media/images/result_images")
 
-        saved_image_path = save_image(file, upload_dir)
+        async def insert_rows(saved):
+            db_image = models.ResultImageData(
+                image=str(saved[0].path),
+                result_id=scope.result.id,
+            )
+            db.add(db_image)
+            await db.commit()
+            await db.refresh(db_image)
+            return db_image
 
-        db_image = models.ResultImageData(
-            image=str(saved_image_path),
-            result_id=result_id,
-        )
-        db.add(db_image)
-        db.commit()
-        db.refresh(db_image)
+        db_image = await save_images(db, [file], upload_dir, insert_rows)
 
         return db_image
     except HTTPException as http_exception:
@@ -718,19 +412,17 @@ async def upload_result_image(
     response_model=List[schemas.ResultImageData],
 )
 async def get_result_images(
-    hospital_id: int,
-    patient_id: str,
-    cell_test_id: str,
-    result_id: str,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    scope: Scope = Depends(get_result_scope),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
         result_images = (
-            db.query(models.ResultImageData)
-            .filter(models.ResultImageData.result_id == result_id)
-            .all()
-        )
+            await db.scalars(
+                select(models.ResultImageData).where(
+                    models.ResultImageData.result_id == scope.result.id
+                )
+            )
+        ).all()
 
         if not result_images:
             raise HTTPException(
@@ -738,5 +430,7 @@ async def get_result_images(
             )
 
         return result_images
+    except HTTPException as http_exception:
+        raise http_exception
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve images: {e}")
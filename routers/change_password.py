@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
 from hashing import Hashing
 import database, schemas, models
-from JWTtoken import get_current_user
+from JWTtoken import get_current_user, invalidate_user
 
 
 router = APIRouter()
@@ -16,10 +17,10 @@ router = APIRouter(tags=["Password-change"])
 async def change_password(
     password_change: schemas.PasswordChange,
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     # Verify current password
-    if not Hashing.verify(
+    if not await Hashing.verify_async(
         current_user.hashed_password, password_change.current_password
     ):
         raise HTTPException(
@@ -28,9 +29,15 @@ async def change_password(
         )
 
     # Hash the new password
-    new_hashed_password = Hashing.bcrypt(password_change.new_password)
-
-    current_user.hashed_password = new_hashed_password
-    db.commit()
+    new_hashed_password = await Hashing.bcrypt_async(password_change.new_password)
+
+    # current_user is a cached snapshot, so update the stored row
+    await db.execute(
+        update(models.User)
+        .where(models.User.id == current_user.id)
+        .values(hashed_password=new_hashed_password)
+    )
+    await db.commit()
+    invalidate_user(current_user.id)
 
     return password_change
@@ -2,35 +2,142 @@ from fastapi import (
     APIRouter,
     HTTPException,
     Depends,
+    Query,
     status,
 )
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased, selectinload
+from datetime import date, timedelta
+from typing import Optional
 import database, schemas, models
+from analytics import hospital_analytics
 from JWTtoken import get_admin_user
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset_page
+from ownership import Scope, get_hospital_scope
+from responses import ModelResponse
 
 router = APIRouter(prefix="/hospital", tags=["Hospital"])
 get_db = database.get_db
 
+# Longest date range one analytics request may cover
+ANALYTICS_MAX_DAYS = 366
 
-# Get all hospitals
-@router.get("/", response_model=list[schemas.Hospital])
+
+# Relations GET /hospital/ can include with ?expand=users,patients
+HOSPITAL_EXPANSIONS = {
+    "users": models.User,
+    "patients": models.Patient,
+}
+# Expanded relations are capped per hospital, so a page never returns more
+# than limit * expand_limit rows of each; user_count and patient_count show
+# whether a list was cut short, the full lists are paged on their own routes
+DEFAULT_EXPAND_LIMIT = 20
+MAX_EXPAND_LIMIT = 100
+
+
+def parse_expand(expand: Optional[str], allowed: dict):
+    names = {name.strip() for name in (expand or "").split(",") if name.strip()}
+    unknown = names - allowed.keys()
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Cannot expand {', '.join(sorted(unknown))}",
+        )
+    return names
+
+
+# Number of rows per hospital among the given hospitals
+async def count_by_hospital(db: AsyncSession, model, hospital_ids: list):
+    rows = await db.execute(
+        select(model.hospital_id, func.count())
+        .where(model.hospital_id.in_(hospital_ids))
+        .group_by(model.hospital_id)
+    )
+    return dict(rows.all())
+
+
+# The first `limit` rows of model per hospital, in id order, from one query
+async def first_by_hospital(db: AsyncSession, model, hospital_ids: list, limit: int):
+    ranked = (
+        select(
+            model,
+            func.row_number()
+            .over(partition_by=model.hospital_id, order_by=model.id)
+            .label("rank"),
+        )
+        .where(model.hospital_id.in_(hospital_ids))
+        .subquery()
+    )
+    row = aliased(model, ranked)
+    rows = await db.scalars(
+        select(row).where(ranked.c.rank <= limit).order_by(row.hospital_id, row.id)
+    )
+    by_hospital = {}
+    for item in rows:
+        by_hospital.setdefault(item.hospital_id, []).append(item)
+    return by_hospital
+
+
+# Get all hospitals, a page at a time, with user and patient counts
+@router.get("/", response_model=schemas.HospitalPage)
 async def get_all_hospitals(
-    db: Session = Depends(get_db),
+    expand: Optional[str] = None,
+    expand_limit: int = Query(DEFAULT_EXPAND_LIMIT, ge=1, le=MAX_EXPAND_LIMIT),
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db),
     current_admin: models.User = Depends(get_admin_user),
 ):
-    hospitals = db.query(models.Hospital).all()
-    return hospitals
+    expanded = parse_expand(expand, HOSPITAL_EXPANSIONS)
+    hospitals, next_cursor = await keyset_page(
+        db, select(models.Hospital), [models.Hospital.id], cursor, limit
+    )
+
+    hospital_ids = [hospital.id for hospital in hospitals]
+    user_counts = await count_by_hospital(db, models.User, hospital_ids)
+    patient_counts = await count_by_hospital(db, models.Patient, hospital_ids)
+    # One query per expanded relation for the whole page
+    expansions = {
+        name: await first_by_hospital(
+            db, HOSPITAL_EXPANSIONS[name], hospital_ids, expand_limit
+        )
+        for name in expanded
+    }
+
+    items = []
+    for hospital in hospitals:
+        item = {
+            "id": hospital.id,
+            "name": hospital.name,
+            "address": hospital.address,
+            "phone": hospital.phone,
+            "email": hospital.email,
+            "user_count": user_counts.get(hospital.id, 0),
+            "patient_count": patient_counts.get(hospital.id, 0),
+        }
+        for name, by_hospital in expansions.items():
+            item[name] = by_hospital.get(hospital.id, [])
+        items.append(item)
+    return ModelResponse(
+        {"items": items, "next_cursor": next_cursor}, schemas.HospitalPage
+    )
 
 
 # Get hospital by id
 @router.get("/{hospital_id}", response_model=schemas.Hospital)
 async def get_hospital_by_id(
     hospital_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_admin: models.User = Depends(get_admin_user),
 ):
-    hospital = (
-        db.query(models.Hospital).filter(models.Hospital.id == hospital_id).first()
+    hospital = await db.scalar(
+        select(models.Hospital)
+        .options(
+            selectinload(models.Hospital.users),
+            selectinload(models.Hospital.patients),
+        )
+        .where(models.Hospital.id == hospital_id)
     )
     if not hospital:
         raise HTTPException(
@@ -39,11 +146,35 @@ async def get_hospital_by_id(
     return hospital
 
 
+# Detection analytics for a hospital, the last 30 days unless a range is given
+@router.get("/{hospital_id}/analytics", response_model=schemas.HospitalAnalytics)
+async def get_hospital_analytics(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    bins: int = Query(10, ge=1, le=100),
+    scope: Scope = Depends(get_hospital_scope),
+    db: AsyncSession = Depends(get_db),
+):
+    end = end or date.today()
+    start = start or end - timedelta(days=30)
+    if start > end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must not be after end",
+        )
+    if (end - start).days >= ANALYTICS_MAX_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Date range cannot exceed {ANALYTICS_MAX_DAYS} days",
+        )
+    return await hospital_analytics(db, scope.hospital.id, start, end, bins)
+
+
 # Create a hospital
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_hospital(
     hospital: schemas.HospitalCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_admin: models.User = Depends(get_admin_user),
 ):
     new_hospital = models.Hospital(
@@ -53,8 +184,8 @@ async def create_hospital(
         email=hospital.email,
     )
     db.add(new_hospital)
-    db.commit()
-    db.refresh(new_hospital)
+    await db.commit()
+    await db.refresh(new_hospital)
     return new_hospital
 
 
@@ -63,11 +194,16 @@ async def create_hospital(
 async def update_hospital(
     hospital_id: int,
     updated_hospital: schemas.Hospital,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_admin: models.User = Depends(get_admin_user),
 ):
-    hospital = (
-        db.query(models.Hospital).filter(models.Hospital.id == hospital_id).first()
+    hospital = await db.scalar(
+        select(models.Hospital)
+        .options(
+            selectinload(models.Hospital.users),
+            selectinload(models.Hospital.patients),
+        )
+        .where(models.Hospital.id == hospital_id)
     )
     if not hospital:
         raise HTTPException(
@@ -79,8 +215,8 @@ async def update_hospital(
     hospital.phone = updated_hospital.phone
     hospital.email = updated_hospital.email
 
-    db.commit()
-    db.refresh(hospital)
+    await db.commit()
+    await db.refresh(hospital)
     return hospital
 
 
@@ -88,17 +224,22 @@ async def update_hospital(
 @router.delete("/{hospital_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_hospital(
     hospital_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_admin: models.User = Depends(get_admin_user),
 ):
-    hospital = (
-        db.query(models.Hospital).filter(models.Hospital.id == hospital_id).first()
+    hospital = await db.scalar(
+        select(models.Hospital)
+        .options(
+            selectinload(models.Hospital.users),
+            selectinload(models.Hospital.patients),
+        )
+        .where(models.Hospital.id == hospital_id)
     )
     if not hospital:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Hospital not found"
         )
 
-    db.delete(hospital)
-    db.commit()
+    await db.delete(hospital)
+    await db.commit()
     return {"detail": "Hospital deleted"}
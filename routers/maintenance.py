@@ -0,0 +1,68 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+import database, schemas, models
+from JWTtoken import get_admin_user
+from scheduler import scheduler
+
+router = APIRouter(prefix="/scheduler", tags=["Scheduler"])
+
+
+# Registered jobs with run counts, average duration and the latest run
+@router.get("/jobs", response_model=List[schemas.ScheduledJob])
+async def get_scheduled_jobs(
+    db: AsyncSession = Depends(database.get_db),
+    current_admin: models.User = Depends(get_admin_user),
+):
+    Run = models.ScheduledJobRun
+    stats = {
+        name: (runs, average)
+        for name, runs, average in await db.execute(
+            select(Run.job_name, func.count(Run.id), func.avg(Run.duration))
+            .where(Run.job_name.in_(scheduler.jobs))
+            .group_by(Run.job_name)
+        )
+    }
+    latest = (
+        select(Run.job_name, func.max(Run.id).label("id"))
+        .where(Run.job_name.in_(scheduler.jobs))
+        .group_by(Run.job_name)
+        .subquery()
+    )
+    last_runs = {
+        run.job_name: run
+        for run in await db.scalars(select(Run).join(latest, Run.id == latest.c.id))
+    }
+
+    jobs = []
+    for name, (_, trigger, trigger_args) in scheduler.jobs.items():
+        runs, average = stats.get(name, (0, None))
+        jobs.append(
+            schemas.ScheduledJob(
+                name=name,
+                trigger=f"{trigger} {trigger_args}",
+                next_run_time=scheduler.next_run_time(name),
+                runs=runs,
+                average_duration=average,
+                last_run=last_runs.get(name),
+            )
+        )
+    return jobs
+
+
+# Run history, newest first
+@router.get("/runs", response_model=List[schemas.ScheduledJobRun])
+async def get_scheduled_job_runs(
+    job_name: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(database.get_db),
+    current_admin: models.User = Depends(get_admin_user),
+):
+    query = select(models.ScheduledJobRun)
+    if job_name:
+        query = query.where(models.ScheduledJobRun.job_name == job_name)
+    runs = await db.scalars(
+        query.order_by(models.ScheduledJobRun.id.desc()).limit(limit)
+    )
+    return runs.all()
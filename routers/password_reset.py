@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, Form, Request
 from fastapi.responses import HTMLResponse
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 import database, models
 from email_utils import send_password_reset_email
 import hashing
+from JWTtoken import invalidate_user
 from fastapi.templating import Jinja2Templates
 from schemas import PasswordResetRequest
 
@@ -25,11 +27,13 @@ serializer = URLSafeTimedSerializer(SECRET_KEY)
 
 @router.post("/send-reset-email")
 async def send_reset_email(
-    request: PasswordResetRequest, db: Session = Depends(database.get_db)
+    request: PasswordResetRequest, db: AsyncSession = Depends(database.get_db)
 ):
     try:
         # Check if the email exists in the database
-        user = db.query(models.User).filter(models.User.email == request.email).first()
+        user = await db.scalar(
+            select(models.User).where(models.User.email == request.email)
+        )
         if not user:
             raise HTTPException(status_code=404, detail="Email is not registered")
 
@@ -37,16 +41,18 @@ async def send_reset_email(
         token = serializer.dumps(request.email, salt="password-reset-salt")
         reset_token = models.PasswordResetToken(email=request.email, token=token)
         db.add(reset_token)
-        db.commit()
+        await db.commit()
         send_password_reset_email(request.email, token)
         return {"message": "Password reset email sent"}
     finally:
-        db.close()
+        await db.close()
 
 
 @router.get("/reset-password", response_class=HTMLResponse)
 async def reset_password_form(
-    token: str = None, request: Request = None, db: Session = Depends(database.get_db)
+    token: str = None,
+    request: Request = None,
+    db: AsyncSession = Depends(database.get_db),
 ):
     if token is None:
         return HTMLResponse("Token not provided", status_code=400)
@@ -54,8 +60,8 @@ async def reset_password_form(
         email = serializer.loads(
             token, salt="password-reset-salt", max_age=TOKEN_EXPIRY_MINUTES * 60
         )
-        token_record = (
-            db.query(models.PasswordResetToken).filter_by(token=token).first()
+        token_record = await db.scalar(
+            select(models.PasswordResetToken).filter_by(token=token)
         )
         if token_record is None or token_record.used:
             return HTMLResponse("Invalid or used token", status_code=400)
@@ -71,14 +77,16 @@ async def reset_password_form(
 
 @router.post("/reset-password/{token}")
 async def reset_password(
-    token: str, new_password: str = Form(...), db: Session = Depends(database.get_db)
+    token: str,
+    new_password: str = Form(...),
+    db: AsyncSession = Depends(database.get_db),
 ):
     try:
         email = serializer.loads(
             token, salt="password-reset-salt", max_age=TOKEN_EXPIRY_MINUTES * 60
         )
-        token_record = (
-            db.query(models.PasswordResetToken).filter_by(token=token).first()
+        token_record = await db.scalar(
+            select(models.PasswordResetToken).filter_by(token=token)
         )
         if token_record is None or token_record.used:
             raise HTTPException(status_code=400, detail="Invalid or used token")
@@ -88,15 +96,16 @@ async def reset_password(
         raise HTTPException(status_code=400, detail="Invalid token")
 
     try:
-        user = db.query(models.User).filter(models.User.email == email).first()
+        user = await db.scalar(select(models.User).where(models.User.email == email))
         if user:
-            hashed_password = hashing.Hashing.bcrypt(new_password)
+            hashed_password = await hashing.Hashing.bcrypt_async(new_password)
             user.hashed_password = hashed_password
-            db.commit()
+            await db.commit()
             token_record.used = True
-            db.commit()
+            await db.commit()
+            invalidate_user(user.id)
             return {"message": "Password reset successful"}
         else:
             raise HTTPException(status_code=404, detail="User not found")
     finally:
-        db.close()
+        await db.close()
@@ -2,18 +2,33 @@ from fastapi import (
     APIRouter,
     HTTPException,
     Depends,
+    Query,
+    Request,
     status,
 )
-from sqlalchemy.orm import Session
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
+from datetime import date, datetime
 import database, schemas, models
+from conditional import conditional_get
+from fieldsets import Fieldset
 from JWTtoken import get_current_user
-from typing import List
-
+from ownership import Scope, get_patient_scope
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset_page
+from typing import List, Optional
 
 router = APIRouter(prefix="/hospital", tags=["Patients"])
 get_db = database.get_db
 
+patient_list_fields = Fieldset(models.Patient, schemas.Patient)
+patient_fields = Fieldset(
+    models.Patient,
+    schemas.PatientWithAddressAndCellTests,
+    default_expand=("address", "cell_tests"),
+)
+
 
 # Create a patient for specific hospital
 @router.post(
@@ -23,7 +38,7 @@ get_db = database.get_db
 )
 async def create_patient_for_hospital(
     patient: schemas.PatientCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     if current_user.is_admin:
@@ -33,10 +48,8 @@ async def create_patient_for_hospital(
         hospital_id_to_use = current_user.hospital_id
 
     # Check if hospital exists
-    db_hospital = (
-        db.query(models.Hospital)
-        .filter(models.Hospital.id == hospital_id_to_use)
-        .first()
+    db_hospital = await db.scalar(
+        select(models.Hospital).where(models.Hospital.id == hospital_id_to_use)
     )
     if not db_hospital:
         raise HTTPException(
@@ -51,16 +64,28 @@ async def create_patient_for_hospital(
         hospital_id=hospital_id_to_use,
     )
     db.add(db_patient)
-    db.commit()
-    db.refresh(db_patient)
+    await db.commit()
+    await db.refresh(db_patient)
     return db_patient
 
 
-# Retrieve all patients for a hospital
-@router.get("/{hospital_id}/patients", response_model=List[schemas.Patient])
+# Retrieve patients for a hospital, one page at a time
+@router.get(
+    "/{hospital_id}/patients",
+    response_model=None,
+    responses={200: {"model": schemas.PatientPage}},
+)
 async def get_patients_form_hospital(
+    request: Request,
     hospital_id: int,
-    db: Session = Depends(get_db),
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    name: Optional[str] = None,
+    born_after: Optional[date] = None,
+    born_before: Optional[date] = None,
+    created_since: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     if not current_user.is_admin and current_user.hospital_id != hospital_id:
@@ -68,21 +93,63 @@ async def get_patients_form_hospital(
             status_code=status.HTTP_403_FORBIDDEN, detail="Permission denied"
         )
 
-    patients = (
-        db.query(models.Patient).filter(models.Patient.hospital_id == hospital_id).all()
+    selection = patient_list_fields.parse(fields, None)
+    sort_columns = [
+        models.Patient.last_name,
+        models.Patient.first_name,
+        models.Patient.id,
+    ]
+    query = select(models.Patient).where(models.Patient.hospital_id == hospital_id)
+
+    # Optional filters
+    if name:
+        prefix = name.replace("%", r"\%").replace("_", r"\_") + "%"
+        query = query.where(
+            or_(
+                models.Patient.last_name.ilike(prefix, escape="\\"),
+                models.Patient.first_name.ilike(prefix, escape="\\"),
+            )
+        )
+    if born_after:
+        query = query.where(models.Patient.birth_date >= born_after)
+    if born_before:
+        query = query.where(models.Patient.birth_date <= born_before)
+    if created_since:
+        query = query.where(models.Patient.created_at >= created_since)
+
+    not_modified, headers = await conditional_get(
+        request,
+        db,
+        query.with_only_columns(func.count(), func.max(models.Patient.updated_at)),
+    )
+    if not_modified:
+        return not_modified
+
+    query = query.options(*patient_list_fields.load_options(selection, sort_columns))
+    patients, next_cursor = await keyset_page(db, query, sort_columns, cursor, limit)
+    return ORJSONResponse(
+        {
+            "items": [
+                patient_list_fields.render(patient, selection) for patient in patients
+            ],
+            "next_cursor": next_cursor,
+        },
+        headers=headers,
     )
-    return patients
 
 
 # Retrieve patients with patient id
 @router.get(
     "/{hospital_id}/patients/{patient_id}",
-    response_model=schemas.PatientWithAddressAndCellTests,
+    response_model=None,
+    responses={200: {"model": schemas.PatientWithAddressAndCellTests}},
 )
 async def get_patient_by_id(
     patient_id: str,
     hospital_id: int,
-    db: Session = Depends(get_db),
+    fields: Optional[str] = None,
+    expand: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     if not current_user.is_admin and current_user.hospital_id != hospital_id:
@@ -90,13 +157,12 @@ async def get_patient_by_id(
             status_code=status.HTTP_403_FORBIDDEN, detail="Permission denied"
         )
 
-    patient = (
-        db.query(models.Patient)
-        .outerjoin(models.Address)
-        .outerjoin(models.CellTest)
-        .filter(models.Patient.id == patient_id)
-        .filter(models.Patient.hospital_id == hospital_id)
-        .first()
+    selection = patient_fields.parse(fields, expand)
+    patient = await db.scalar(
+        select(models.Patient)
+        .options(*patient_fields.load_options(selection))
+        .where(models.Patient.id == patient_id)
+        .where(models.Patient.hospital_id == hospital_id)
     )
 
     if not patient:
@@ -104,34 +170,17 @@ async def get_patient_by_id(
             status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found"
         )
 
-    return patient
+    return ORJSONResponse(patient_fields.render(patient, selection))
 
 
 # Update a patient
 @router.put("/{hospital_id}/patients/{patient_id}", response_model=schemas.Patient)
 async def update_patient(
-    hospital_id: int,
-    patient_id: str,
     patient: schemas.PatientCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    scope: Scope = Depends(get_patient_scope),
+    db: AsyncSession = Depends(get_db),
 ):
-    db_patient = (
-        db.query(models.Patient)
-        .filter(
-            models.Patient.id == patient_id, models.Patient.hospital_id == hospital_id
-        )
-        .first()
-    )
-    if db_patient is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found"
-        )
-    if not current_user.is_admin and current_user.hospital_id != hospital_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN, detail="Permission denied"
-        )
-
+    db_patient = scope.patient
     for field, value in patient.dict().items():
         if isinstance(value, dict) and hasattr(db_patient, field):
             # Handle nested dicts or related models
@@ -145,37 +194,20 @@ async def update_patient(
         else:
             setattr(db_patient, field, value)
 
-    db.commit()
-    db.refresh(db_patient)
+    await db.commit()
+    await db.refresh(db_patient)
     return db_patient
 
 
 # Delete a patient
 @router.delete("/{hospital_id}/patients/{patient_id}", response_model=schemas.Patient)
 async def delete_patient(
-    hospital_id: int,
-    patient_id: str,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    scope: Scope = Depends(get_patient_scope),
+    db: AsyncSession = Depends(get_db),
 ):
-    db_patient = (
-        db.query(models.Patient)
-        .filter(
-            models.Patient.id == patient_id, models.Patient.hospital_id == hospital_id
-        )
-        .first()
-    )
-    if db_patient is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found"
-        )
-    if not current_user.is_admin and current_user.hospital_id != hospital_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN, detail="Permission denied"
-        )
-
-    db.delete(db_patient)
-    db.commit()
+    db_patient = scope.patient
+    await db.delete(db_patient)
+    await db.commit()
     return db_patient
 
 
@@ -186,43 +218,18 @@ async def delete_patient(
     response_model=schemas.Address,
 )
 async def create_address_for_patient(
-    hospital_id: int,
-    patient_id: str,
     address: schemas.AddressCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    scope: Scope = Depends(get_patient_scope),
+    db: AsyncSession = Depends(get_db),
 ):
-    db_hospital = (
-        db.query(models.Hospital).filter(models.Hospital.id == hospital_id).first()
-    )
-    if not db_hospital:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Hospital not found"
-        )
-    db_patient = (
-        db.query(models.Patient)
-        .filter(
-            models.Patient.id == patient_id, models.Patient.hospital_id == hospital_id
-        )
-        .first()
-    )
-    if not db_patient:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found"
-        )
-
-    if not current_user.is_admin and current_user.hospital_id != hospital_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN, detail="Permission denied"
-        )
     db_address = models.Address(
         street=address.street,
         city=address.city,
-        patient_id=patient_id,
+        patient_id=scope.patient.id,
     )
     db.add(db_address)
-    db.commit()
-    db.refresh(db_address)
+    await db.commit()
+    await db.refresh(db_address)
     return db_address
 
 
@@ -232,30 +239,14 @@ async def create_address_for_patient(
     response_model=List[schemas.AddressGet],
 )
 async def get_addresses_for_patient(
-    hospital_id: int,
-    patient_id: str,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    scope: Scope = Depends(get_patient_scope),
+    db: AsyncSession = Depends(get_db),
 ):
-    db_patient = (
-        db.query(models.Patient)
-        .filter(
-            models.Patient.id == patient_id, models.Patient.hospital_id == hospital_id
-        )
-        .first()
-    )
-    if db_patient is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found"
-        )
-    if not current_user.is_admin and current_user.hospital_id != hospital_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN, detail="Permission denied"
-        )
-
     address = (
-        db.query(models.Address).filter(models.Address.patient_id == patient_id).all()
-    )
+        await db.scalars(
+            select(models.Address).where(models.Address.patient_id == scope.patient.id)
+        )
+    ).all()
     return address
 
 
@@ -265,34 +256,27 @@ async def get_addresses_for_patient(
     response_model=schemas.Address,
 )
 async def update_address_for_patient(
-    hospital_id: int,
-    patient_id: str,
     address_id: int,
     address: schemas.AddressUpdate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    scope: Scope = Depends(get_patient_scope),
+    db: AsyncSession = Depends(get_db),
 ):
-    db_address = (
-        db.query(models.Address)
-        .filter(
-            models.Address.id == address_id, models.Address.patient_id == patient_id
+    db_address = await db.scalar(
+        select(models.Address).where(
+            models.Address.id == address_id,
+            models.Address.patient_id == scope.patient.id,
         )
-        .first()
     )
     if db_address is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Address not found"
         )
-    if not current_user.is_admin and current_user.hospital_id != hospital_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN, detail="Permission denied"
-        )
 
     for field, value in address.dict().items():
         setattr(db_address, field, value)
 
-    db.commit()
-    db.refresh(db_address)
+    await db.commit()
+    await db.refresh(db_address)
     return db_address
 
 
@@ -302,28 +286,21 @@ async def update_address_for_patient(
     response_model=schemas.Address,
 )
 async def delete_address_for_patient(
-    hospital_id: int,
-    patient_id: str,
     address_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    scope: Scope = Depends(get_patient_scope),
+    db: AsyncSession = Depends(get_db),
 ):
-    db_address = (
-        db.query(models.Address)
-        .filter(
-            models.Address.id == address_id, models.Address.patient_id == patient_id
+    db_address = await db.scalar(
+        select(models.Address).where(
+            models.Address.id == address_id,
+            models.Address.patient_id == scope.patient.id,
         )
-        .first()
     )
     if db_address is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Address not found"
         )
-    if not current_user.is_admin and current_user.hospital_id != hospital_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN, detail="Permission denied"
-        )
 
-    db.delete(db_address)
-    db.commit()
+    await db.delete(db_address)
+    await db.commit()
     return db_address
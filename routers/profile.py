@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import schemas, models
-from JWTtoken import get_current_user
+from JWTtoken import get_current_user, invalidate_user
 from database import get_db
 
 router = APIRouter(tags=["Profile"])
@@ -24,10 +25,10 @@ async def get_user_profile(current_user: models.User = Depends(get_current_user)
 async def update_user_profile(
     user_update: schemas.ProfileUpdate,
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     # Retrieve the current user from the database
-    user = db.query(models.User).filter(models.User.id == current_user.id).first()
+    user = await db.scalar(select(models.User).where(models.User.id == current_user.id))
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -45,7 +46,8 @@ async def update_user_profile(
     if user_update.contact_no:
         user.contact_no = user_update.contact_no
 
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    invalidate_user(user.id)
 
     return user
@@ -1,12 +1,15 @@
-from fastapi import APIRouter, HTTPException, Depends, status, BackgroundTasks
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, Request, status, BackgroundTasks
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 import jwt
 import database, schemas, models
+from conditional import conditional_get
 from hashing import Hashing
 from email_utils import send_verification_email
-from JWTtoken import get_current_user, get_admin_or_hospital_admin
+from JWTtoken import get_current_user, get_admin_or_hospital_admin, invalidate_user
 from typing import List
+from responses import ModelResponse
 
 import os
 from dotenv import load_dotenv
@@ -25,13 +28,15 @@ ALGORITHM = "HS256"
 async def create_user(
     user: schemas.UserCreate,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_admin_or_hospital_admin),
 ):
     # Checking if the username or email already exists
-    if db.query(models.User).filter(models.User.username == user.username).first():
+    if await db.scalar(
+        select(models.User.id).where(models.User.username == user.username)
+    ):
         raise HTTPException(status_code=400, detail="Username already registered")
-    if db.query(models.User).filter(models.User.email == user.email).first():
+    if await db.scalar(select(models.User.id).where(models.User.email == user.email)):
         raise HTTPException(status_code=400, detail="Email already registered")
 
     # Set is_admin to False by default if the current user is not an admin
@@ -44,7 +49,7 @@ async def create_user(
         user.hospital_id if current_user.is_admin else current_user.hospital_id
     )
 
-    hashed_password = Hashing.bcrypt(user.password)
+    hashed_password = await Hashing.bcrypt_async(user.password)
 
     new_user = models.User(
         username=user.username,
@@ -62,8 +67,8 @@ async def create_user(
     )
 
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     # Generate a verification token
     expire = datetime.utcnow() + timedelta(hours=24)
@@ -84,31 +89,42 @@ async def create_user(
 # get all user
 @router.get("/", response_model=List[schemas.User])
 async def get_users(
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_admin_or_hospital_admin),
 ):
     if current_user.is_admin:
-        users = db.query(models.User).all()
+        query = select(models.User)
     elif current_user.is_hospital_admin:
-        users = (
-            db.query(models.User)
-            .filter(models.User.hospital_id == current_user.hospital_id)
-            .all()
+        query = select(models.User).where(
+            models.User.hospital_id == current_user.hospital_id
         )
     else:
         raise HTTPException(status_code=403, detail="Not enough permissions")
 
-    return users
+    # The same URL lists different users for admins of different hospitals
+    not_modified, headers = await conditional_get(
+        request,
+        db,
+        query.with_only_columns(func.count(), func.max(models.User.updated_at)),
+        current_user.is_admin,
+        current_user.hospital_id,
+    )
+    if not_modified:
+        return not_modified
+
+    users = (await db.scalars(query)).all()
+    return ModelResponse(users, List[schemas.User], headers=headers)
 
 
 # Retrieve the user by ID
 @router.get("/{user_id}", response_model=schemas.User)
-def get_user_by_id(
+async def get_user_by_id(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = await db.scalar(select(models.User).where(models.User.id == user_id))
 
     if not user:
         raise HTTPException(status_code=404, detail=f"User with ID {user_id} not found")
@@ -142,10 +158,12 @@ def get_user_by_id(
 async def update_user(
     user_id: int,
     user: schemas.UserUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_admin_or_hospital_admin),
 ):
-    user_to_update = db.query(models.User).filter(models.User.id == user_id).first()
+    user_to_update = await db.scalar(
+        select(models.User).where(models.User.id == user_id)
+    )
 
     if not user_to_update:
         raise HTTPException(status_code=404, detail="User not found")
@@ -187,10 +205,8 @@ async def update_user(
 
         if user.hospital_id is not None:
             # Check and update hospital ID if provided
-            hospital_exists = (
-                db.query(models.Hospital)
-                .filter(models.Hospital.id == user.hospital_id)
-                .first()
+            hospital_exists = await db.scalar(
+                select(models.Hospital.id).where(models.Hospital.id == user.hospital_id)
             )
             if not hospital_exists:
                 raise HTTPException(status_code=404, detail="Hospital not found")
@@ -216,8 +232,9 @@ async def update_user(
             if not user.is_admin:
                 user_to_update.is_admin = user.is_admin
 
-    db.commit()
-    db.refresh(user_to_update)
+    await db.commit()
+    await db.refresh(user_to_update)
+    invalidate_user(user_to_update.id)
 
     return user_to_update
 
@@ -226,10 +243,12 @@ async def update_user(
 @router.delete("/{user_id}", status_code=status.HTTP_200_OK)
 async def delete_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_admin_or_hospital_admin),
 ):
-    user_to_delete = db.query(models.User).filter(models.User.id == user_id).first()
+    user_to_delete = await db.scalar(
+        select(models.User).where(models.User.id == user_id)
+    )
 
     if not user_to_delete:
         raise HTTPException(status_code=404, detail="User not found")
@@ -244,15 +263,16 @@ async def delete_user(
     ):
         raise HTTPException(status_code=403, detail="Not enough permissions")
 
-    db.delete(user_to_delete)
-    db.commit()
+    await db.delete(user_to_delete)
+    await db.commit()
+    invalidate_user(user_id)
 
     return {"message": "User deleted successfully"}
 
 
 # verify users email
 @router.get("/verify/{token}", response_model=dict)
-def verify_user_email(token: str, db: Session = Depends(get_db)):
+async def verify_user_email(token: str, db: AsyncSession = Depends(get_db)):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = payload.get("user_id")
@@ -262,7 +282,7 @@ def verify_user_email(token: str, db: Session = Depends(get_db)):
                 status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid token"
             )
 
-        user = db.query(models.User).filter(models.User.id == user_id).first()
+        user = await db.scalar(select(models.User).where(models.User.id == user_id))
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
@@ -272,7 +292,8 @@ def verify_user_email(token: str, db: Session = Depends(get_db)):
             return {"message": "Email is already verified"}
 
         user.is_verified = True
-        db.commit()
+        await db.commit()
+        invalidate_user(user.id)
 
         return {"message": "Email verified successfully"}
 
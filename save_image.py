@@ -1,19 +1,180 @@
 from fastapi import (
+    HTTPException,
     UploadFile,
-    Path,
+    status,
 )
+from contextlib import asynccontextmanager
+from pathlib import Path
+from sqlalchemy import func, select, text
+from starlette.concurrency import run_in_threadpool
+from typing import List, NamedTuple
+import hashlib
+import os
 import uuid
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
-def save_image(file: UploadFile, upload_dir: Path):
+import models
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Uploads are copied in chunks of this size, so memory use stays flat per file
+CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+# Largest accepted upload in bytes (default 512 MB)
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(512 * 1024 * 1024)))
+
+
+class SavedImage(NamedTuple):
+    path: Path
+    sha256: str
+    size: int
+    # False when identical bytes were already stored and the upload was discarded
+    created: bool
+
+
+# Moving a file into place and inserting the rows pointing at it must not
+# interleave with release_image counting those rows and unlinking the file,
+# or a delete could remove a file a concurrent duplicate upload is about to
+# reference. Every API process writes the same upload directories, so the
+# lock is per path and shared between processes: a transaction level
+# advisory lock on Postgres, released by the commit or rollback, otherwise
+# (single host SQLite runs) a lock file next to the image.
+@asynccontextmanager
+async def image_file_locks(db, paths: list):
+    # Always taken in the same order, so two uploads cannot deadlock
+    paths = sorted({str(path) for path in paths})
+    lock_files = []
+    try:
+        if db.bind.dialect.name == "postgresql":
+            for path in paths:
+                await db.execute(
+                    text("SELECT pg_advisory_xact_lock(hashtext(:path))"),
+                    {"path": path},
+                )
+        else:
+            for path in paths:
+                lock_files.append(await run_in_threadpool(_lock_file, Path(path)))
+        yield
+        # Ends the transaction holding the advisory locks; a no-op when the
+        # caller has just committed
+        await db.commit()
+    except BaseException:
+        await db.rollback()
+        raise
+    finally:
+        for lock_file in lock_files:
+            lock_file.close()
+
+
+def _lock_file(path: Path):
+    lock_file = open(path.with_name(f".{path.name}.lock"), "a+")
+    try:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+    except BaseException:
+        lock_file.close()
+        raise
+    return lock_file
+
+
+# Files are named by the SHA-256 of their content, so identical uploads share
+# one file. CellTestImageData/ResultImageData rows pointing at the path are
+# its references; release_image removes the file when the last one goes.
+# Returns the temporary file holding the upload and its final SavedImage.
+def stage_image(file: UploadFile, upload_dir: Path):
     if not upload_dir.exists():
-        upload_dir.mkdir(parents=True)
+        upload_dir.mkdir(parents=True, exist_ok=True)
+
+    file_extension = file.filename.split(".")[-1].lower()
+    temp_path = upload_dir / f".{uuid.uuid4()}.part"
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with temp_path.open("wb") as buffer:
+            while chunk := file.file.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_UPLOAD_SIZE:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"{file.filename} exceeds the {MAX_UPLOAD_SIZE} byte limit",
+                    )
+                digest.update(chunk)
+                buffer.write(chunk)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+    sha256 = digest.hexdigest()
+    file_path = upload_dir / f"{sha256}.{file_extension}"
+    return temp_path, SavedImage(file_path, sha256, size, False)
+
+
+# Call with the image's lock held, see image_file_locks
+def place_image(temp_path: Path, image: SavedImage) -> SavedImage:
+    created = not image.path.exists()
+    if created:
+        # Only expose the file under its final name once it is complete
+        os.replace(temp_path, image.path)
+    else:
+        temp_path.unlink()
+    return image._replace(created=created)
+
+
+# Saves the uploads and runs insert_rows(saved_images), which adds the image
+# rows and commits, returning its result. Uploads are streamed to disk before
+# any lock is taken; if the insert fails the session is rolled back and files
+# no other row uses are removed again.
+async def save_images(db, files: List[UploadFile], upload_dir: Path, insert_rows):
+    staged = []
+    saved = []
+    try:
+        for file in files:
+            staged.append(await run_in_threadpool(stage_image, file, upload_dir))
+
+        async with image_file_locks(db, [image.path for _, image in staged]):
+            while staged:
+                temp_path, image = staged.pop(0)
+                saved.append(await run_in_threadpool(place_image, temp_path, image))
+            return await insert_rows(saved)
+    except BaseException:
+        # The locks are gone with the rollback, release_image takes them again
+        for image in saved:
+            if image.created:
+                await release_image(db, str(image.path))
+        raise
+    finally:
+        for temp_path, _ in staged:
+            temp_path.unlink(missing_ok=True)
+
+
+# Number of image rows still pointing at a stored file
+async def count_image_references(db, path: str):
+    cell_test_refs = await db.scalar(
+        select(func.count())
+        .select_from(models.CellTestImageData)
+        .where(models.CellTestImageData.image == path)
+    )
+    result_refs = await db.scalar(
+        select(func.count())
+        .select_from(models.ResultImageData)
+        .where(models.ResultImageData.image == path)
+    )
+    return cell_test_refs + result_refs
 
-    # Generate a unique filename using uuid
-    file_extension = file.filename.split(".")[-1]
-    unique_filename = f"{uuid.uuid4()}.{file_extension}"
 
-    file_path = upload_dir / unique_filename
-    with file_path.open("wb") as buffer:
-        buffer.write(file.file.read())
-    return file_path
+# Unlink a stored file once no rows reference it; call after the delete commits
+async def release_image(db, path: str):
+    async with image_file_locks(db, [path]):
+        if await count_image_references(db, path):
+            return False
+        await run_in_threadpool(Path(path).unlink, missing_ok=True)
+        return True
@@ -0,0 +1,217 @@
+from apscheduler.schedulers.background import BackgroundScheduler
+from sqlalchemy import text
+import database
+import models
+import datetime
+import logging
+import os
+import socket
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Every app process tries to become leader; only the leader runs jobs
+SCHEDULER_LOCK_KEY = int(os.getenv("SCHEDULER_LOCK_KEY", "724310"))
+SCHEDULER_LOCK_FILE = os.getenv("SCHEDULER_LOCK_FILE", "scheduler.lock")
+# How often followers retry the lock and the leader checks it still holds it
+SCHEDULER_ELECTION_INTERVAL = float(os.getenv("SCHEDULER_ELECTION_INTERVAL", "30"))
+
+# Job run statuses
+RUN_RUNNING = "running"
+RUN_SUCCEEDED = "succeeded"
+RUN_FAILED = "failed"
+
+
+# Session level Postgres advisory lock, held on a dedicated connection
+class AdvisoryLock:
+    def __init__(self, engine, key: int):
+        self.engine = engine
+        self.key = key
+        self._connection = None
+
+    def acquire(self):
+        connection = self.engine.connect().execution_options(
+            isolation_level="AUTOCOMMIT"
+        )
+        locked = connection.execute(
+            text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key}
+        ).scalar()
+        if locked:
+            self._connection = connection
+        else:
+            connection.close()
+        return bool(locked)
+
+    # The lock lives as long as the connection, so check the connection
+    def held(self):
+        try:
+            self._connection.execute(text("SELECT 1"))
+            return True
+        except Exception:
+            return False
+
+    def release(self):
+        if self._connection is None:
+            return
+        try:
+            self._connection.execute(
+                text("SELECT pg_advisory_unlock(:key)"), {"key": self.key}
+            )
+        except Exception:
+            pass
+        self._connection.close()
+        self._connection = None
+
+
+# Lock file for single host deployments without Postgres
+class FileLock:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def acquire(self):
+        lock_file = open(self.path, "a+")
+        try:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            return False
+        self._file = lock_file
+        return True
+
+    def held(self):
+        return self._file is not None
+
+    def release(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def make_lock(engine):
+    if engine.dialect.name == "postgresql":
+        return AdvisoryLock(engine, SCHEDULER_LOCK_KEY)
+    return FileLock(SCHEDULER_LOCK_FILE)
+
+
+# Wraps a job so every run is recorded in scheduled_job_runs
+def record_runs(name: str, func):
+    def run():
+        db = database.SessionLocal()
+        try:
+            job_run = models.ScheduledJobRun(
+                job_name=name, host=socket.gethostname(), status=RUN_RUNNING
+            )
+            db.add(job_run)
+            db.commit()
+
+            start = time.perf_counter()
+            try:
+                result = func()
+                job_run.status = RUN_SUCCEEDED
+                job_run.message = None if result is None else str(result)
+            except Exception as e:
+                logger.exception(f"Scheduled job {name} failed")
+                job_run.status = RUN_FAILED
+                job_run.message = str(e)
+            job_run.duration = time.perf_counter() - start
+            job_run.finished_at = datetime.datetime.utcnow()
+            db.commit()
+        finally:
+            db.close()
+
+    return run
+
+
+# APScheduler that only runs jobs in the process holding the leader lock
+class LeaderScheduler:
+    def __init__(self, lock, interval: float):
+        self.lock = lock
+        self.interval = interval
+        self.jobs = {}
+        self.is_leader = False
+        self._scheduler = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    # Register a maintenance job, e.g. add_job("cleanup", func, "cron", hour=0)
+    def add_job(self, name: str, func, trigger: str, **trigger_args):
+        self.jobs[name] = (func, trigger, trigger_args)
+
+    # Decorator form of add_job
+    def job(self, trigger: str, name: str = None, **trigger_args):
+        def register(func):
+            self.add_job(name or func.__name__, func, trigger, **trigger_args)
+            return func
+
+        return register
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._elect, name="scheduler-election", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._step_down()
+
+    def _elect(self):
+        while not self._stop.is_set():
+            try:
+                if not self.is_leader and self.lock.acquire():
+                    self._lead()
+                elif self.is_leader and not self.lock.held():
+                    logger.warning("Scheduler lost its leader lock")
+                    self._step_down()
+            except Exception:
+                logger.exception("Scheduler leader election failed")
+            self._stop.wait(self.interval)
+
+    def _lead(self):
+        self._scheduler = BackgroundScheduler()
+        for name, (func, trigger, trigger_args) in self.jobs.items():
+            self._scheduler.add_job(
+                record_runs(name, func),
+                trigger,
+                id=name,
+                name=name,
+                coalesce=True,
+                max_instances=1,
+                **trigger_args,
+            )
+        self._scheduler.start()
+        self.is_leader = True
+        logger.info(f"Scheduler leader elected on {socket.gethostname()}:{os.getpid()}")
+
+    def _step_down(self):
+        if self._scheduler is not None:
+            self._scheduler.shutdown(wait=False)
+            self._scheduler = None
+        self.is_leader = False
+        self.lock.release()
+
+    def next_run_time(self, name: str):
+        if self._scheduler is None:
+            return None
+        job = self._scheduler.get_job(name)
+        return job.next_run_time if job else None
+
+
+scheduler = LeaderScheduler(make_lock(database.engine), SCHEDULER_ELECTION_INTERVAL)
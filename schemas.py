@@ -1,9 +1,18 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, computed_field, field_validator
+from typing import Dict, Optional, List
 from datetime import date, datetime
 from uuid import UUID
 
 
+# Base URL for accessing result images
+RESULT_IMAGES_URL = "http://127.0.0.1:8000/media/result_images"
+
+
+# Timestamps are shown as plain dates in listings
+def to_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
 # Base model for User
 class UserBase(BaseModel):
     username: str
@@ -33,6 +42,9 @@ class UserCreate(UserBase):
 
 # User model
 class User(UserBase):
+    # Stored addresses were validated on the way in; checking them again on
+    # every response dominates the cost of large user lists
+    email: str
     id: int
     is_verified: bool
     is_admin: bool
@@ -114,6 +126,24 @@ class Hospital(HospitalBase):
         from_attributes = True
 
 
+# Hospital list entry with user and patient counts; the users and patients
+# themselves are only included when expanded
+class HospitalSummary(HospitalBase):
+    id: int
+    user_count: int = 0
+    patient_count: int = 0
+    users: Optional[List[User]] = None
+    patients: Optional[List["Patient"]] = None
+
+    class Config:
+        from_attributes = True
+
+
+class HospitalPage(BaseModel):
+    items: List[HospitalSummary]
+    next_cursor: Optional[str] = None
+
+
 # Base model for Patient
 class PatientBase(BaseModel):
     first_name: str
@@ -137,6 +167,12 @@ class Patient(PatientBase):
         form_attributes = True
 
 
+# Page of patients with the cursor for the next page
+class PatientPage(BaseModel):
+    items: List[Patient]
+    next_cursor: Optional[str] = None
+
+
 # Base model for Address
 class AddressBase(BaseModel):
     street: str
@@ -252,6 +288,11 @@ class ResultImageDataCreate(ResultImageData):
 class ResultImageData(ResultImageData):
     id: int
 
+    @computed_field
+    @property
+    def image_url(self) -> str:
+        return f"{RESULT_IMAGES_URL}/{self.id}"
+
     class Config:
         from_attributes = True
 
@@ -263,6 +304,8 @@ class ResultBase(BaseModel):
     celltest_id: UUID
     result_images: Optional[List[ResultImageData]] = []
 
+    _created_date = field_validator("created_at", mode="before")(to_date)
+
 
 # Model for creating a result
 class ResultCreate(ResultBase):
@@ -272,6 +315,11 @@ class ResultCreate(ResultBase):
 # Result model
 class Result(ResultBase):
     id: UUID
+    background_pixels: Optional[int] = None
+    inflammatory_pixels: Optional[int] = None
+    cell_pixels: Optional[int] = None
+    inflammatory_ratio: Optional[float] = None
+    cell_ratio: Optional[float] = None
 
     class Config:
         from_attributes = True
@@ -281,13 +329,122 @@ class CellTestFetch(BaseModel):
     id: UUID
     title: str
     description: Optional[str]
-    updated_at: datetime
-    created_at: datetime
+    updated_at: date
+    created_at: date
     detection_status: str
     results: Optional[List[Result]] = []
 
+    _dates = field_validator("created_at", "updated_at", mode="before")(to_date)
+
+    class Config:
+        from_attributes = True
+
+
+# Page of cell tests with the cursor for the next page
+class CellTestPage(BaseModel):
+    items: List[CellTestFetch]
+    next_cursor: Optional[str] = None
+
 
 # Changing the password
 class PasswordChange(BaseModel):
     current_password: str
     new_password: str
+
+
+# Detection job model
+class DetectionJob(BaseModel):
+    id: UUID
+    cell_test_id: UUID
+    status: str
+    progress: int
+    message: Optional[str] = None
+    attempts: int
+    images_total: int
+    images_done: int
+    result_id: Optional[UUID] = None
+    batch_id: Optional[UUID] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+# Detection job progress event with the estimated time left
+class DetectionProgress(DetectionJob):
+    eta_seconds: Optional[float] = None
+
+
+# Cell tests to process in one batch: explicit ids and/or a hospital and date range
+class DetectionBatchCreate(BaseModel):
+    cell_test_ids: Optional[List[UUID]] = None
+    hospital_id: Optional[int] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+
+
+# Detection batch with job counts per status and the per cell test outcomes
+class DetectionBatch(BaseModel):
+    id: UUID
+    created_at: datetime
+    total_jobs: int
+    status: str
+    counts: Dict[str, int]
+    jobs: List[DetectionJob] = []
+    # On creation: active jobs of the requested cell tests in other batches
+    skipped: List[DetectionJob] = []
+
+
+# Histogram of a ratio over [0, 1], edges has one more entry than counts
+class Histogram(BaseModel):
+    edges: List[float]
+    counts: List[int]
+
+
+# Distribution of one detection metric
+class MetricSummary(BaseModel):
+    count: int
+    mean: Optional[float] = None
+    min: Optional[float] = None
+    max: Optional[float] = None
+    percentiles: Dict[str, float] = {}
+    histogram: Histogram
+
+
+# Detection analytics for a hospital over a date range
+class HospitalAnalytics(BaseModel):
+    hospital_id: int
+    start: date
+    end: date
+    cell_tests: int
+    detection_status: Dict[str, int]
+    results: int
+    pixels: Dict[str, int]
+    metrics: Dict[str, MetricSummary]
+
+
+# Scheduled job run history
+class ScheduledJobRun(BaseModel):
+    id: int
+    job_name: str
+    host: str
+    status: str
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    duration: Optional[float] = None
+    message: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+# Registered scheduled job with its latest run
+class ScheduledJob(BaseModel):
+    name: str
+    trigger: str
+    next_run_time: Optional[datetime] = None
+    runs: int
+    average_duration: Optional[float] = None
+    last_run: Optional[ScheduledJobRun] = None
@@ -0,0 +1,82 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+# The app reads its settings at import time and serves static/ and media/
+# relative to the working directory, so both are set up before main is
+# imported. Runs against a throwaway SQLite database.
+WORKDIR = Path(tempfile.mkdtemp(prefix="cancer-cell-tests-"))
+(WORKDIR / "media").mkdir()
+for name in ("static", "templates"):
+    (WORKDIR / name).symlink_to(ROOT / name)
+os.chdir(WORKDIR)
+
+os.environ["DATABASE_URL"] = f"sqlite:///{WORKDIR / 'test.db'}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["JWTtoken"] = "test-secret-key"
+os.environ["REFRESH_KEY"] = "test-refresh-key"
+os.environ["PasswordResetToken"] = "test-password-reset-key"
+os.environ["UserSecretKey"] = "test-user-secret-key"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import database  # noqa: E402
+import main  # noqa: E402
+import models  # noqa: E402
+from hashing import Hashing  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def db():
+    session = database.SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def make_user(db):
+    created = []
+
+    def make_user(username: str, hospital: bool = True, is_admin: bool = False):
+        hospital_id = None
+        if hospital:
+            db_hospital = models.Hospital(name=f"{username} hospital")
+            db.add(db_hospital)
+            db.flush()
+            hospital_id = db_hospital.id
+        user = models.User(
+            username=username,
+            email=f"{username}@example.com",
+            full_name=username,
+            address="Kathmandu",
+            blood_group="O+",
+            gender="female",
+            contact_no="9800000000",
+            hashed_password=Hashing.bcrypt("password"),
+            is_verified=True,
+            is_admin=is_admin,
+            is_hospital_admin=False,
+            hospital_id=hospital_id,
+        )
+        db.add(user)
+        db.commit()
+        created.append(user)
+        return user
+
+    yield make_user
+    db.query(models.User).filter(
+        models.User.id.in_([user.id for user in created])
+    ).delete()
+    db.commit()
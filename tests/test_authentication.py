@@ -0,0 +1,61 @@
+import pytest
+
+
+def login(client, username: str):
+    response = client.post(
+        "/login", data={"username": username, "password": "password"}
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def bearer(token: str):
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.mark.parametrize("is_admin", [False, True])
+def test_refreshed_token_reaches_protected_route(client, make_user, is_admin):
+    user = make_user(f"refresh_{int(is_admin)}", is_admin=is_admin)
+    tokens = login(client, user.username)
+
+    response = client.post(
+        "/refresh-token", params={"refresh_token": tokens["refresh_token"]}
+    )
+    assert response.status_code == 200
+    access_token = response.json()["access_token"]
+
+    response = client.get("/home", headers=bearer(access_token))
+    assert response.status_code == 200
+    assert user.username in response.json()["message"]
+
+
+def test_refreshed_token_carries_login_claims(client, make_user):
+    from JWTtoken import decode_access_token
+
+    user = make_user("refresh_claims")
+    tokens = login(client, user.username)
+    refreshed = client.post(
+        "/refresh-token", params={"refresh_token": tokens["refresh_token"]}
+    ).json()["access_token"]
+
+    claims = decode_access_token(tokens["access_token"])
+    refreshed_claims = decode_access_token(refreshed)
+    for claim in ("sub", "id", "is_admin", "hospital_id", "is_hospital_admin"):
+        assert refreshed_claims[claim] == claims[claim]
+
+
+def test_refresh_rejects_invalid_token(client):
+    response = client.post("/refresh-token", params={"refresh_token": "not-a-token"})
+    assert response.status_code == 401
+
+
+def test_refresh_rejects_deleted_user(client, make_user, db):
+    user = make_user("refresh_deleted")
+    tokens = login(client, user.username)
+    db.delete(user)
+    db.commit()
+
+    response = client.post(
+        "/refresh-token", params={"refresh_token": tokens["refresh_token"]}
+    )
+    assert response.status_code == 401